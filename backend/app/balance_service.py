@@ -0,0 +1,52 @@
+"""
+Weekly Balance Service
+Per-driver Easy/Medium/Hard route counts for the last 7 days,
+loaded for a whole location (or a set of drivers) in a single GROUP BY query
+"""
+from .models import Route, User, RouteGrade, Assignment, AssignmentStatus
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional
+
+BALANCE_WINDOW_DAYS = 7
+
+def empty_balance() -> Dict[RouteGrade, int]:
+    return {RouteGrade.EASY: 0, RouteGrade.MEDIUM: 0, RouteGrade.HARD: 0}
+
+def get_weekly_balances(
+    db: Session,
+    location_id: Optional[str] = None,
+    driver_ids: Optional[Iterable[int]] = None
+) -> Dict[int, Dict[RouteGrade, int]]:
+    """
+    Count accepted/completed routes per driver and grade over the last 7 days
+    Returns {driver_id: {RouteGrade: count}}; drivers without routes are left out,
+    use balance_for() to read an entry with zero defaults
+    """
+    one_week_ago = datetime.now() - timedelta(days=BALANCE_WINDOW_DAYS)
+    query = db.query(
+        Assignment.driver_id, Route.grade, func.count(Assignment.id)
+    ).join(
+        Route, Assignment.route_id == Route.id
+    ).filter(
+        Assignment.assigned_date >= one_week_ago,
+        Assignment.status.in_([AssignmentStatus.ACCEPTED, AssignmentStatus.COMPLETED])
+    )
+
+    if location_id is not None:
+        query = query.join(User, Assignment.driver_id == User.id).filter(User.location_id == location_id)
+    if driver_ids is not None:
+        query = query.filter(Assignment.driver_id.in_(list(driver_ids)))
+
+    balances = {}
+    for driver_id, grade, count in query.group_by(Assignment.driver_id, Route.grade):
+        if grade is None:
+            continue
+        balances.setdefault(driver_id, empty_balance())[grade] = count
+
+    return balances
+
+def balance_for(balances: Dict[int, Dict[RouteGrade, int]], driver_id: int) -> Dict[RouteGrade, int]:
+    """Weekly balance of one driver from a preloaded balances dict"""
+    return balances.get(driver_id) or empty_balance()
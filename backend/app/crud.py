@@ -1,4 +1,6 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import update, select
+from typing import List
 from . import models, schemas
 
 import random
@@ -54,8 +56,56 @@ def get_route(db: Session, route_id: int):
 def get_routes(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.Route).offset(skip).limit(limit).all()
 
+def assignment_load_options(with_driver: bool = False):
+    """
+    Load the route (and optionally driver) JOINed into the assignment SELECT, so
+    serializing AssignmentResponse (which embeds the route) never lazy-loads row by row
+    """
+    options = [joinedload(models.Assignment.route)]
+    if with_driver:
+        options.append(joinedload(models.Assignment.driver))
+    return options
+
+def assignments_query(db: Session, with_driver: bool = False):
+    return db.query(models.Assignment).options(*assignment_load_options(with_driver))
+
+def assignments_select(with_driver: bool = False):
+    """assignments_query() as a select() for AsyncSession, where lazy loads are not allowed"""
+    return select(models.Assignment).options(*assignment_load_options(with_driver))
+
+def get_assignment(db: Session, assignment_id: int, with_driver: bool = False):
+    return assignments_query(db, with_driver).filter(models.Assignment.id == assignment_id).first()
+
 def get_assignments(db: Session, driver_id: int = None):
-    q = db.query(models.Assignment)
+    q = assignments_query(db)
     if driver_id:
         q = q.filter(models.Assignment.driver_id == driver_id)
     return q.all()
+
+def claim_routes(db: Session, route_ids: List[int]) -> bool:
+    """
+    Mark several routes assigned in one statement, only if all are still unassigned
+    Returns False when some were already claimed; the caller should roll back
+    """
+    result = db.execute(
+        update(models.Route)
+        .where(models.Route.id.in_(route_ids), models.Route.is_assigned == False)
+        .values(is_assigned=True)
+    )
+    return result.rowcount == len(route_ids)
+
+def transition_assignment(db: Session, assignment: models.Assignment, from_status: models.AssignmentStatus, **values) -> bool:
+    """
+    Move an assignment out of from_status only if nobody changed it since it was loaded
+    Returns False when another request already responded to it
+    """
+    result = db.execute(
+        update(models.Assignment)
+        .where(
+            models.Assignment.id == assignment.id,
+            models.Assignment.status == from_status,
+            models.Assignment.version == assignment.version
+        )
+        .values(version=models.Assignment.version + 1, **values)
+    )
+    return result.rowcount == 1
@@ -0,0 +1,117 @@
+"""
+Admin Dashboard Service
+Dashboard stats for a location built from the fleet state (drivers, validated
+with its fingerprint query) and two GROUP BY queries over assignments, cached
+per location for a short TTL and invalidated on dispatch, assignment responses
+and availability changes
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+import threading
+import time
+import os
+
+from . import models, schemas, balance_service
+from .fleet_state import fleet_state
+
+# Upper bound on how stale a cached dashboard can get (other processes' writes only expire it)
+DASHBOARD_CACHE_TTL_SECONDS = float(os.getenv("DASHBOARD_CACHE_TTL_SECONDS", "10"))
+
+# Drivers above this fatigue (or not in NORMAL health) are listed for attention
+ATTENTION_FATIGUE = 70
+
+_cache: Dict[str, Tuple[float, schemas.DashboardStats]] = {}
+_cache_lock = threading.Lock()
+
+# Bumped by invalidate() so a rebuild that raced with a write is not cached
+_generation = 0
+
+def build_dashboard(db: Session, location_id: str) -> schemas.DashboardStats:
+    """Compute the dashboard for one location; query count does not grow with fleet size"""
+    # One fingerprint query keeps the drivers as fresh as the TTL, whichever process wrote them
+    drivers = list(fleet_state.get(location_id, validate_db=db).drivers.values())
+    fatigue_scores = [d.fatigue_score for d in drivers if d.fatigue_score is not None]
+    avg_fatigue = sum(fatigue_scores) / len(fatigue_scores) if fatigue_scores else 0
+    
+    # Today's assignments of this location's drivers, counted per driver and status
+    today_start = datetime.combine(datetime.now().date(), datetime.min.time())
+    counts = db.query(
+        models.Assignment.driver_id, models.Assignment.status, func.count(models.Assignment.id)
+    ).join(
+        models.User, models.Assignment.driver_id == models.User.id
+    ).filter(
+        models.User.location_id == location_id,
+        models.Assignment.assigned_date >= today_start
+    ).group_by(models.Assignment.driver_id, models.Assignment.status).all()
+    
+    status_totals = {}
+    driver_totals = {}
+    driver_pending = {}
+    for driver_id, assignment_status, count in counts:
+        status_totals[assignment_status] = status_totals.get(assignment_status, 0) + count
+        driver_totals[driver_id] = driver_totals.get(driver_id, 0) + count
+        if assignment_status == models.AssignmentStatus.PENDING:
+            driver_pending[driver_id] = count
+    
+    # Drivers needing attention
+    attention = [
+        d for d in drivers
+        if (d.fatigue_score is not None and d.fatigue_score > ATTENTION_FATIGUE)
+        or (d.health_status is not None and d.health_status != models.HealthStatus.NORMAL)
+    ]
+    
+    weekly_balances = balance_service.get_weekly_balances(
+        db, driver_ids=[driver.id for driver in attention]
+    ) if attention else {}
+    
+    attention_drivers = []
+    for driver in attention:
+        weekly_balance = balance_service.balance_for(weekly_balances, driver.id)
+        attention_drivers.append(schemas.DriverStats(
+            driver_id=driver.id,
+            driver_name=driver.name,
+            fatigue=driver.fatigue_score,
+            credits=driver.credits,
+            bonus_credits=driver.bonus_credits,
+            health_status=driver.health_status.value,
+            weekly_balance={k.name: v for k, v in weekly_balance.items()},
+            total_assignments=driver_totals.get(driver.id, 0),
+            pending_assignments=driver_pending.get(driver.id, 0)
+        ))
+    
+    return schemas.DashboardStats(
+        total_drivers=len(drivers),
+        active_drivers=sum(1 for d in drivers if d.is_available),
+        total_routes_today=sum(status_totals.values()),
+        pending_assignments=status_totals.get(models.AssignmentStatus.PENDING, 0),
+        completed_today=status_totals.get(models.AssignmentStatus.COMPLETED, 0),
+        avg_fatigue=float(avg_fatigue or 0),
+        drivers_needing_attention=attention_drivers
+    )
+
+def get_dashboard(db: Session, location_id: str) -> schemas.DashboardStats:
+    """Cached dashboard of a location, rebuilt once its TTL runs out or it is invalidated"""
+    now = time.monotonic()
+    with _cache_lock:
+        entry = _cache.get(location_id)
+        generation = _generation
+    if entry is not None and entry[0] > now:
+        return entry[1]
+    
+    stats = build_dashboard(db, location_id)
+    with _cache_lock:
+        if generation == _generation:
+            _cache[location_id] = (now + DASHBOARD_CACHE_TTL_SECONDS, stats)
+    return stats
+
+def invalidate(location_id: Optional[str] = None):
+    """Drop the cached dashboard of a location (or of every location) after a write"""
+    global _generation
+    with _cache_lock:
+        _generation += 1
+        if location_id is None:
+            _cache.clear()
+        else:
+            _cache.pop(location_id, None)
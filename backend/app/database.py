@@ -1,8 +1,12 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+import threading
 import os
 
+from .pool_metrics import InstrumentedQueuePool, InstrumentedAsyncQueuePool
+
 # Database Configuration
 # Set your MySQL credentials here or use environment variable
 MYSQL_USER = os.getenv("MYSQL_USER", "root")
@@ -14,40 +18,207 @@ MYSQL_DATABASE = os.getenv("MYSQL_DATABASE", "fairdispatch")
 # Construct MySQL URL
 MYSQL_URL = f"mysql+mysqlconnector://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DATABASE}"
 
-# Allow override via environment variable
-DATABASE_URL = os.getenv("DATABASE_URL", MYSQL_URL)
+SQLITE_FALLBACK_URL = "sqlite:///./fairdispatch.db"
+
+def pool_settings(prefix: str, pool_size: int, max_overflow: int) -> dict:
+    """Pool sizing for one engine, overridable per deployment with <prefix>_POOL_SIZE etc."""
+    return {
+        "pool_size": int(os.getenv(f"{prefix}_POOL_SIZE", str(pool_size))),
+        "max_overflow": int(os.getenv(f"{prefix}_MAX_OVERFLOW", str(max_overflow))),
+        "pool_timeout": float(os.getenv(f"{prefix}_POOL_TIMEOUT", os.getenv("DB_POOL_TIMEOUT", "30"))),
+        "pool_recycle": int(os.getenv(f"{prefix}_POOL_RECYCLE", os.getenv("DB_POOL_RECYCLE", "3600"))),
+    }
+
+# Interactive API traffic (sync and async endpoints each get a pool of this size)
+INTERACTIVE_POOL = pool_settings("DB", pool_size=5, max_overflow=10)
+
+# Batch work: dispatch jobs, auto-dispatch, report rendering and the email outbox,
+# kept apart so a large dispatch cannot starve driver requests of connections
+BATCH_POOL = pool_settings("DB_BATCH", pool_size=3, max_overflow=2)
+
+# Read replicas (comma separated URLs) serving the read-only endpoints; routing is in replica_router
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+REPLICA_POOL = pool_settings("DB_REPLICA", pool_size=5, max_overflow=10)
+
+# Async drivers for the same database: aiomysql for MySQL, aiosqlite for the fallback
+ASYNC_DRIVERS = {
+    "mysql+mysqlconnector": "mysql+aiomysql",
+    "mysql+pymysql": "mysql+aiomysql",
+    "mysql": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+}
 
-print(f"Attempting to connect to database...")
+def async_url(url: str) -> str:
+    """DATABASE_URL rewritten for the matching async driver"""
+    scheme, sep, rest = url.partition("://")
+    return ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
 
-# Try MySQL first, fallback to SQLite
-try:
-    engine = create_engine(
-        DATABASE_URL,
+# Engines are created on first use (or by init_db), not at import:
+# importing this module never opens a connection
+_engine = None
+_batch_engine = None
+_async_engine = None
+_replica_engines = []
+_database_url = None
+_async_database_url = None
+_init_lock = threading.Lock()
+
+def _create_sync_engine(url: str, pool: dict):
+    connect_args = {"check_same_thread": False} if url.startswith("sqlite") else {}
+    return create_engine(
+        url,
         echo=False,
+        poolclass=InstrumentedQueuePool,
         pool_pre_ping=True,  # Verify connections before using
-        pool_recycle=3600,   # Recycle connections after 1 hour
+        connect_args=connect_args,
+        **pool
     )
-    # Test connection
-    with engine.connect() as conn:
-        print(f"Connected to MySQL database: {MYSQL_DATABASE}")
-        print(f"Host: {MYSQL_HOST}:{MYSQL_PORT}")
-except Exception as e:
-    print(f"MySQL connection failed: {str(e)}")
-    print("Falling back to SQLite...")
-    DATABASE_URL = "sqlite:///./fairdispatch.db"
-    engine = create_engine(
-        DATABASE_URL,
+
+def _create_async_engine(url: str, pool: dict):
+    if url.startswith("sqlite"):
+        # aiosqlite keeps its dialect default (no pooling): a pooled connection
+        # holds a non-daemon thread tied to the event loop that opened it
+        return create_async_engine(url, echo=False)
+    return create_async_engine(
+        url,
         echo=False,
-        connect_args={"check_same_thread": False}
+        poolclass=InstrumentedAsyncQueuePool,
+        pool_pre_ping=True,
+        **pool
     )
-    print("Using SQLite database: fairdispatch.db")
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def _connect_sync_engine():
+    """Try the configured database (MySQL by default), fall back to SQLite"""
+    url = os.getenv("DATABASE_URL", MYSQL_URL)
+    print(f"Attempting to connect to database...")
+    
+    try:
+        engine = _create_sync_engine(url, INTERACTIVE_POOL)
+        # Test connection
+        with engine.connect() as conn:
+            if engine.dialect.name == "mysql":
+                print(f"Connected to MySQL database: {MYSQL_DATABASE}")
+                print(f"Host: {MYSQL_HOST}:{MYSQL_PORT}")
+            else:
+                print(f"Connected to {engine.dialect.name} database")
+        return engine, url
+    except Exception as e:
+        print(f"MySQL connection failed: {str(e)}")
+        print("Falling back to SQLite...")
+        engine = _create_sync_engine(SQLITE_FALLBACK_URL, INTERACTIVE_POOL)
+        print("Using SQLite database: fairdispatch.db")
+        return engine, SQLITE_FALLBACK_URL
+
+def init_db():
+    """
+    Create the engines and bind the session factories; safe to call repeatedly
+    Called at app startup, and implicitly by the first session or engine access
+    """
+    global _engine, _batch_engine, _async_engine, _replica_engines, _database_url, _async_database_url
+    if _engine is not None:
+        return _engine
+    
+    with _init_lock:
+        if _engine is not None:
+            return _engine
+        
+        engine, url = _connect_sync_engine()
+        batch_engine = _create_sync_engine(url, BATCH_POOL)
+        
+        # Used by the high-traffic async endpoints; connections are opened lazily
+        async_database_url = os.getenv("ASYNC_DATABASE_URL", async_url(url))
+        async_engine = _create_async_engine(async_database_url, INTERACTIVE_POOL)
+        
+        # Replicas connect lazily; an unreachable one is taken out of rotation by replica_router
+        replica_engines = [
+            (_create_sync_engine(replica_url, REPLICA_POOL), _create_async_engine(async_url(replica_url), REPLICA_POOL))
+            for replica_url in DATABASE_REPLICA_URLS
+        ]
+        if replica_engines:
+            print(f"Configured {len(replica_engines)} read replica(s)")
+        
+        SessionLocal.configure(bind=engine)
+        BatchSessionLocal.configure(bind=batch_engine)
+        AsyncSessionLocal.configure(bind=async_engine)
+        _database_url, _async_database_url = url, async_database_url
+        _batch_engine = batch_engine
+        _async_engine = async_engine
+        _replica_engines = replica_engines
+        _engine = engine
+    return _engine
+
+def get_engine():
+    return init_db()
+
+def get_batch_engine():
+    init_db()
+    return _batch_engine
+
+def get_async_engine():
+    init_db()
+    return _async_engine
+
+def get_replica_engines():
+    """(sync engine, async engine) of every configured read replica"""
+    init_db()
+    return list(_replica_engines)
+
+def pool_metrics() -> dict:
+    """Live metrics of every connection pool, keyed by workload"""
+    if _engine is None:
+        return {}
+    pools = {
+        "interactive": _engine.pool,
+        "interactive_async": _async_engine.sync_engine.pool,
+        "batch": _batch_engine.pool,
+    }
+    for index, (replica, async_replica) in enumerate(_replica_engines):
+        pools[f"replica_{index}"] = replica.pool
+        pools[f"replica_{index}_async"] = async_replica.sync_engine.pool
+    return {name: pool.metrics() for name, pool in pools.items() if hasattr(pool, "metrics")}
+
+class _LazySessionmaker(sessionmaker):
+    """sessionmaker that initializes the database on the first session"""
+    
+    def __call__(self, **local_kw):
+        if _engine is None:
+            init_db()
+        return super().__call__(**local_kw)
+
+class _LazyAsyncSessionmaker(async_sessionmaker):
+    def __call__(self, **local_kw):
+        if _engine is None:
+            init_db()
+        return super().__call__(**local_kw)
+
+SessionLocal = _LazySessionmaker(autocommit=False, autoflush=False)
+BatchSessionLocal = _LazySessionmaker(autocommit=False, autoflush=False)
+AsyncSessionLocal = _LazyAsyncSessionmaker(autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
+def __getattr__(name):
+    # Legacy module attributes (database.engine, DATABASE_URL, ...) resolve on first access
+    if name == "engine":
+        return get_engine()
+    if name == "batch_engine":
+        return get_batch_engine()
+    if name == "async_engine":
+        return get_async_engine()
+    if name == "DATABASE_URL":
+        init_db()
+        return _database_url
+    if name == "ASYNC_DATABASE_URL":
+        init_db()
+        return _async_database_url
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,115 @@
+"""
+Dispatch Job Queue
+POST /dispatch/run?wait=false enqueues a job and returns its id right away; a worker pool
+runs perform_dispatch with its own DB session and the job exposes progress,
+result and timing breakdown for polling via /dispatch/jobs/{id}
+"""
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from datetime import datetime
+from typing import List, Optional
+import threading
+import uuid
+import os
+
+from . import database, dispatch_service
+
+# Concurrent dispatch jobs across all locations
+DISPATCH_JOB_WORKERS = int(os.getenv("DISPATCH_JOB_WORKERS", "2"))
+
+# Finished jobs kept for polling, oldest dropped first
+DISPATCH_JOB_HISTORY = int(os.getenv("DISPATCH_JOB_HISTORY", "500"))
+
+job_executor = ThreadPoolExecutor(
+    max_workers=DISPATCH_JOB_WORKERS,
+    thread_name_prefix="dispatch-job"
+)
+
+class DispatchJob:
+    """One queued or running dispatch for a location"""
+
+    def __init__(self, location_id: str, solver: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.location_id = location_id
+        self.solver = solver
+        self.status = "queued"
+        self.progress = dispatch_service.DispatchProgress()
+        self.result = None
+        self.error = None
+        self.created_at = datetime.now()
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "location_id": self.location_id,
+            "solver": self.solver,
+            "status": self.status,
+            "progress": self.progress.to_dict(),
+            "timings": dict(self.progress.timings),
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+_jobs = OrderedDict()
+_jobs_lock = threading.Lock()
+
+def _run_job(job: DispatchJob):
+    job.status = "running"
+    job.started_at = datetime.now()
+
+    db = database.BatchSessionLocal()
+    try:
+        job.result = dispatch_service.perform_dispatch(
+            job.location_id, db, solver=job.solver, progress=job.progress
+        )
+        job.status = "completed"
+    except dispatch_service.DispatchInProgress as e:
+        # Started by another process or the scheduler
+        job.error = str(e)
+        job.status = "rejected"
+    except Exception as e:
+        db.rollback()
+        job.error = str(e)
+        job.status = "failed"
+        print(f"Dispatch job {job.id} for {job.location_id} failed: {e}")
+    finally:
+        db.close()
+        job.finished_at = datetime.now()
+
+def submit(location_id: str, solver: Optional[str] = None) -> DispatchJob:
+    """
+    Queue a dispatch for a location and return its job immediately
+    A location with a queued or running job gets that job back instead of a duplicate
+    """
+    with _jobs_lock:
+        for active in _jobs.values():
+            if active.location_id == location_id and active.status in ("queued", "running"):
+                return active
+        
+        job = DispatchJob(location_id, solver)
+        _jobs[job.id] = job
+        while len(_jobs) > DISPATCH_JOB_HISTORY:
+            oldest_id, oldest = next(iter(_jobs.items()))
+            if oldest.status in ("queued", "running"):
+                break
+            del _jobs[oldest_id]
+
+    job_executor.submit(_run_job, job)
+    return job
+
+def get_job(job_id: str) -> Optional[DispatchJob]:
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+def list_jobs(location_id: Optional[str] = None) -> List[DispatchJob]:
+    """Known jobs, newest first"""
+    with _jobs_lock:
+        jobs = list(_jobs.values())
+    if location_id:
+        jobs = [job for job in jobs if job.location_id == location_id]
+    return jobs[::-1]
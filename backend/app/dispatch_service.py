@@ -0,0 +1,472 @@
+"""
+Dispatch Service
+Core dispatch run for one location, shared by the API, the scheduler and workers
+Runs for the same location are serialized with a DB lease, and routes are
+claimed with a conditional UPDATE so concurrent writers never double-assign
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy import insert, update, select, func, case, literal
+from datetime import datetime
+from typing import List, Optional, Tuple
+from contextlib import contextmanager
+from collections import Counter
+import time
+import os
+from . import models, crud, email_service, pdf_service, balance_service, dashboard_service, leader_election
+from .fleet_state import fleet_state
+from .event_hub import event_hub
+
+# A crashed run stops blocking its location after this long
+DISPATCH_LOCK_TTL_SECONDS = int(os.getenv("DISPATCH_LOCK_TTL_SECONDS", "900"))
+
+# Assignments written per transaction by the bulk persistence stage
+DISPATCH_WRITE_CHUNK_SIZE = int(os.getenv("DISPATCH_WRITE_CHUNK_SIZE", "500"))
+
+# Once a location had its dispatch run for the day, place new routes and drivers that
+# become available right away instead of waiting for the next full run
+INCREMENTAL_DISPATCH = os.getenv("INCREMENTAL_DISPATCH", "false").lower() in ("1", "true", "yes")
+
+class DispatchInProgress(Exception):
+    """Another dispatch for the same location holds the location lock"""
+    
+    def __init__(self, location_id: str):
+        super().__init__(f"A dispatch for {location_id} is already running")
+        self.location_id = location_id
+
+class DispatchProgress:
+    """
+    Live counters and per-phase timings of one dispatch run
+    perform_dispatch updates it as it goes; dispatch jobs expose it for polling
+    Each phase (and each persisted chunk) also heartbeats the location lock
+    """
+    
+    def __init__(self):
+        self.drivers_scored = 0
+        self.routes_scored = 0
+        self.assignments_written = 0
+        self.report_status = "pending"
+        self.timings = {}
+        self.location_id = None
+        self.lock: Optional[leader_election.LeaderLease] = None
+    
+    def heartbeat(self):
+        """Keep the location lock alive during a long run; raises DispatchInProgress once it was lost"""
+        if self.lock is not None and not self.lock.renew_if_due():
+            raise DispatchInProgress(self.location_id)
+    
+    @contextmanager
+    def phase(self, name: str):
+        self.heartbeat()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = round(time.perf_counter() - started, 4)
+    
+    def to_dict(self) -> dict:
+        return {
+            "drivers_scored": self.drivers_scored,
+            "routes_scored": self.routes_scored,
+            "assignments_written": self.assignments_written,
+            "report_status": self.report_status
+        }
+
+def perform_dispatch(location_id: str, db: Session, solver: str = None, progress: DispatchProgress = None):
+    """
+    Refactored core dispatch logic for reuse
+    Raises DispatchInProgress if the location is already being dispatched (in any process)
+    """
+    lock = location_lock(location_id)
+    if not lock.try_acquire():
+        raise DispatchInProgress(location_id)
+    progress = progress or DispatchProgress()
+    progress.location_id, progress.lock = location_id, lock
+    try:
+        return _dispatch_location(location_id, db, solver, progress)
+    finally:
+        lock.release()
+
+def location_lock(location_id: str) -> leader_election.LeaderLease:
+    """Lease serializing full runs and incremental placements of one location"""
+    return leader_election.LeaderLease(f"dispatch:{location_id}", DISPATCH_LOCK_TTL_SECONDS)
+
+def _dispatch_location(location_id: str, db: Session, solver: str, progress: DispatchProgress):
+    with progress.phase("load"):
+        # Drivers, routes and policy from the fleet state, checked against the database
+        # with one fingerprint query (routes are still claimed conditionally on write)
+        fleet = fleet_state.get(location_id, validate_db=db)
+        
+        # Get available drivers for this location
+        drivers = fleet.available_drivers()
+        
+        if not drivers:
+            progress.report_status = "skipped"
+            return {"message": "No available drivers", "assignments_count": 0}
+        
+        # Get unassigned routes for this location
+        available_routes = fleet.open_routes()
+        
+        if not available_routes:
+            progress.report_status = "skipped"
+            return {
+                "message": "No unassigned routes found.",
+                "assignments_count": 0
+            }
+        
+        # Get policy
+        policy = fleet.policy
+        
+        if not policy:
+            # Flushed now, committed with the report row
+            policy = models.WeeklyPolicy(location_id=location_id)
+            db.add(policy)
+            db.flush()
+        
+        weekly_balances = balance_service.get_weekly_balances(db, location_id=location_id)
+    
+    # Use Intelligent AI-Powered Assignment System
+    from . import intelligent_dispatch
+    
+    with progress.phase("scoring"):
+        intelligent_assignments = intelligent_dispatch.intelligent_route_assignment(
+            drivers=drivers,
+            routes=available_routes,
+            db=db,
+            policy=policy,
+            solver=solver,
+            weekly_balances=weekly_balances,
+            location_id=location_id
+        )
+    progress.drivers_scored = len(drivers)
+    progress.routes_scored = len(available_routes)
+    
+    with progress.phase("persist"):
+        window_start = datetime.now()
+        
+        # Snapshot before the first commit expires the ORM objects
+        planned = [
+            plan_assignment(driver, route, explanation, reason_code)
+            for driver, route, explanation, reason_code in intelligent_assignments
+        ]
+        
+        # Report row first: every assignment of the run records its id, and a run that
+        # dies part way still gets its written assignments reported (see resubmit_pending_reports)
+        report = models.DailyReport(
+            report_date=window_start,
+            location_id=location_id,
+            assignments_count=0,
+            status="QUEUED",
+            window_start=window_start
+        )
+        db.add(report)
+        db.commit()
+        report_id = report.id
+        if policy is not fleet.policy:
+            # Created above: cache it, or the next fingerprint check would reload the location
+            fleet_state.set_policy(policy, db)
+        
+        assignments_made = []
+        for start in range(0, len(planned), DISPATCH_WRITE_CHUNK_SIZE):
+            progress.heartbeat()
+            written = write_assignment_chunk(db, planned[start:start + DISPATCH_WRITE_CHUNK_SIZE], report_id)
+            fleet_state.apply_dispatch(location_id, written, db)
+            assignments_made.extend(written)
+            progress.assignments_written = len(assignments_made)
+            dashboard_service.invalidate(location_id)
+    
+        window_end = datetime.now()
+    
+    # Generate Report: rendered from the DB by the report worker
+    try:
+        db.execute(
+            update(models.DailyReport)
+            .where(models.DailyReport.id == report_id)
+            .values(report_date=window_end, window_end=window_end, assignments_count=len(assignments_made))
+        )
+        db.commit()
+        pdf_service.submit_report(report_id)
+        progress.report_status = "queued"
+    except Exception as e:
+        db.rollback()
+        print(f"Error report: {e}")
+        progress.report_status = "failed"
+
+    return {
+        "message": "Success",
+        "assignments_count": len(assignments_made),
+        "report_id": report_id,
+        "timings": progress.timings
+    }
+
+def incremental_dispatch_active(db: Session, location_id: str) -> bool:
+    """INCREMENTAL_DISPATCH is on and the location was already dispatched today"""
+    if not INCREMENTAL_DISPATCH:
+        return False
+    today_start = datetime.combine(datetime.now().date(), datetime.min.time())
+    return db.query(models.DailyReport.id).filter(
+        models.DailyReport.location_id == location_id,
+        models.DailyReport.report_date >= today_start
+    ).first() is not None
+
+def dispatch_new_route(db: Session, location_id: str, route_id: int) -> Optional[dict]:
+    """
+    Incremental dispatch of one route: score its column against the available
+    drivers of the location and assign it to the best one above the threshold
+    Returns the written assignment plan, or None when nothing was placed
+    """
+    if not incremental_dispatch_active(db, location_id):
+        return None
+    
+    def place(fleet):
+        route = fleet.routes.get(route_id)
+        if route is None or route.is_assigned:
+            return None
+        weekly_balances = balance_service.get_weekly_balances(db, location_id=location_id)
+        return _place_best_pair(db, location_id, fleet.available_drivers(), [route], weekly_balances)
+    return _place_locked(db, location_id, place)
+
+def dispatch_available_driver(db: Session, location_id: str, driver_id: int) -> Optional[dict]:
+    """
+    Incremental dispatch of one driver who just became available: score their row
+    against the open routes of the location and assign the best one above the threshold
+    """
+    if not incremental_dispatch_active(db, location_id):
+        return None
+    
+    def place(fleet):
+        driver = fleet.drivers.get(driver_id)
+        if driver is None or not driver.is_available:
+            return None
+        weekly_balances = balance_service.get_weekly_balances(db, driver_ids=[driver_id])
+        return _place_best_pair(db, location_id, [driver], fleet.open_routes(), weekly_balances)
+    return _place_locked(db, location_id, place)
+
+def _place_locked(db: Session, location_id: str, place) -> Optional[dict]:
+    """
+    Run place(fleet) under the location lock, on a fleet checked against the database
+    Skipped while a full run (or another placement) holds the lock: the run owns the location
+    """
+    lock = location_lock(location_id)
+    if not lock.try_acquire():
+        return None
+    try:
+        return place(fleet_state.get(location_id, validate_db=db))
+    finally:
+        lock.release()
+
+def _place_best_pair(db: Session, location_id: str, drivers: List, routes: List, weekly_balances: dict) -> Optional[dict]:
+    """Assign the best scoring pair of a one-row or one-column matrix, as the full run would"""
+    from . import intelligent_dispatch
+    from .scoring_engine import build_compatibility_matrix
+    
+    if not drivers or not routes:
+        return None
+    
+    matrix = build_compatibility_matrix(drivers, routes, weekly_balances)
+    i, j = divmod(int(matrix.scores.argmax()), len(routes))
+    if matrix.scores[i, j] <= intelligent_dispatch.MIN_ASSIGNMENT_SCORE:
+        return None
+    
+    driver, route = drivers[i], routes[j]
+    compatibility = matrix.compatibility(i, j)
+    planned = plan_assignment(
+        driver, route,
+        intelligent_dispatch.generate_intelligent_explanation(driver, route, compatibility),
+        intelligent_dispatch.determine_reason_code(driver, route, compatibility)
+    )
+    
+    # The route claim is conditional, so a concurrent full run cannot double-assign it
+    written = write_assignment_chunk(db, [planned])
+    fleet_state.apply_dispatch(location_id, written, db)
+    dashboard_service.invalidate(location_id)
+    return written[0] if written else None
+
+# Fatigue change per route taken, by grade
+FATIGUE_CHANGE = {models.RouteGrade.HARD: 15, models.RouteGrade.MEDIUM: 8, models.RouteGrade.EASY: -5}
+
+def next_driver_state(fatigue_score: float, grade: models.RouteGrade):
+    """Fatigue and health status of a driver after taking a route of this grade"""
+    # Update fatigue
+    if grade == models.RouteGrade.HARD:
+        fatigue_score = min(100, fatigue_score + FATIGUE_CHANGE[grade])
+    elif grade == models.RouteGrade.MEDIUM:
+        fatigue_score = min(100, fatigue_score + FATIGUE_CHANGE[grade])
+    else:
+        fatigue_score = max(0, fatigue_score + FATIGUE_CHANGE[models.RouteGrade.EASY])
+    
+    # Update health
+    if fatigue_score >= 80:
+        health_status = models.HealthStatus.RESTRICTED
+    elif fatigue_score >= 60:
+        health_status = models.HealthStatus.CAUTION
+    else:
+        health_status = models.HealthStatus.NORMAL
+    
+    return fatigue_score, health_status
+
+def driver_state_values(grade: models.RouteGrade, times: int = 1) -> List[Tuple]:
+    """
+    SET clauses applying next_driver_state() times over in SQL, relative to the stored
+    fatigue, so concurrent writers add up instead of overwriting each other's value
+    """
+    health_type = models.User.health_status.type
+    fatigue = func.coalesce(models.User.fatigue_score, 0) + FATIGUE_CHANGE[grade] * times
+    fatigue = case((fatigue > 100, 100), (fatigue < 0, 0), else_=fatigue)
+    health = case(
+        (fatigue >= 80, literal(models.HealthStatus.RESTRICTED, health_type)),
+        (fatigue >= 60, literal(models.HealthStatus.CAUTION, health_type)),
+        else_=literal(models.HealthStatus.NORMAL, health_type)
+    )
+    # Health first: MySQL evaluates SET clauses left to right on already-updated columns
+    return [(models.User.health_status, health), (models.User.fatigue_score, fatigue)]
+
+def plan_assignment(driver: models.User, route: models.Route, explanation: str, reason_code: str) -> dict:
+    """Plain-value snapshot of one assignment and the driver state it leads to"""
+    fatigue_score, health_status = next_driver_state(driver.fatigue_score, route.grade)
+    return {
+        "driver_id": driver.id,
+        "route_id": route.id,
+        "explanation": explanation,
+        "reason_code": reason_code,
+        "grade": route.grade,
+        "fatigue_score": fatigue_score,
+        "health_status": health_status,
+        "driver_name": driver.name,
+        "employee_id": driver.employee_id,
+        "email": driver.email,
+        "route_description": route.description,
+        "area": route.area
+    }
+
+def _insert_assignment_rows(db: Session, chunk: List[dict], report_id: Optional[int]) -> Tuple[List[int], List[int]]:
+    """
+    Bulk insert the assignments and notifications of a claimed chunk; returns their ids in chunk order
+    RETURNING where the driver supports it with executemany (SQLite), otherwise one follow-up select each (MySQL)
+    """
+    assignment_rows = [
+        {
+            "driver_id": a["driver_id"],
+            "route_id": a["route_id"],
+            "explanation": a["explanation"],
+            "assignment_reason": a["reason_code"],
+            "status": models.AssignmentStatus.PENDING,
+            "report_id": report_id
+        }
+        for a in chunk
+    ]
+    notification_rows = [
+        {
+            "user_id": a["driver_id"],
+            "title": f"New {a['grade'].name} Route Assigned",
+            "message": a["explanation"],
+            "notification_type": "route_assigned"
+        }
+        for a in chunk
+    ]
+    
+    if db.get_bind().dialect.insert_executemany_returning_sort_by_parameter_order:
+        assignment_ids = db.execute(
+            insert(models.Assignment).returning(models.Assignment.id, sort_by_parameter_order=True), assignment_rows
+        ).scalars().all()
+        notification_ids = db.execute(
+            insert(models.Notification).returning(models.Notification.id, sort_by_parameter_order=True), notification_rows
+        ).scalars().all()
+        return list(assignment_ids), list(notification_ids)
+    
+    route_ids = [a["route_id"] for a in chunk]
+    driver_ids = list({a["driver_id"] for a in chunk})
+    after_id = db.execute(select(func.max(models.Notification.id))).scalar() or 0
+    db.execute(insert(models.Assignment), assignment_rows)
+    db.execute(insert(models.Notification), notification_rows)
+    
+    # The routes were claimed by this transaction, so each one's newest assignment is ours
+    newest = dict(db.execute(
+        select(models.Assignment.route_id, func.max(models.Assignment.id))
+        .where(models.Assignment.route_id.in_(route_ids))
+        .group_by(models.Assignment.route_id)
+    ).all())
+    
+    # Per driver, this chunk's notifications are the newest ones of that driver, in insertion order
+    inserted = {}
+    for notification_id, user_id in db.execute(
+        select(models.Notification.id, models.Notification.user_id)
+        .where(
+            models.Notification.id > after_id,
+            models.Notification.user_id.in_(driver_ids),
+            models.Notification.notification_type == "route_assigned"
+        )
+        .order_by(models.Notification.id)
+    ):
+        inserted.setdefault(user_id, []).append(notification_id)
+    wanted = Counter(a["driver_id"] for a in chunk)
+    mine = {user_id: ids[len(ids) - wanted[user_id]:] for user_id, ids in inserted.items()}
+    notification_ids = [mine[a["driver_id"]].pop(0) for a in chunk]
+    
+    return [newest[route_id] for route_id in route_ids], notification_ids
+
+def write_assignment_chunk(db: Session, chunk: List[dict], report_id: Optional[int] = None) -> List[dict]:
+    """
+    Claim the routes and write assignments, notifications, driver state and
+    outbox emails for one chunk with a few bulk statements in a single transaction
+    report_id links the assignments to the dispatch run's DailyReport
+    Returns the planned assignments that were written, with their assignment_id and notification_id
+    """
+    if not crud.claim_routes(db, [a["route_id"] for a in chunk]):
+        # A concurrent writer took some of these routes: claim one by one and skip the lost ones
+        db.rollback()
+        chunk = [a for a in chunk if crud.claim_routes(db, [a["route_id"]])]
+        if not chunk:
+            db.commit()
+            return []
+    
+    assignment_ids, notification_ids = _insert_assignment_rows(db, chunk, report_id)
+    chunk = [
+        dict(a, assignment_id=assignment_id, notification_id=notification_id)
+        for a, assignment_id, notification_id in zip(chunk, assignment_ids, notification_ids)
+    ]
+    # Driver state changes relative to the stored values; the plan's absolute values
+    # came from the fleet state, which may trail other processes' writes
+    by_change = {}
+    for (driver_id, grade), times in Counter((a["driver_id"], a["grade"]) for a in chunk).items():
+        by_change.setdefault((grade, times), []).append(driver_id)
+    for (grade, times), driver_ids in by_change.items():
+        db.execute(
+            update(models.User)
+            .where(models.User.id.in_(driver_ids))
+            .ordered_values(*driver_state_values(grade, times))
+            .execution_options(synchronize_session=False)
+        )
+    state = {
+        row.id: row
+        for row in db.execute(
+            select(models.User.id, models.User.fatigue_score, models.User.health_status)
+            .where(models.User.id.in_({a["driver_id"] for a in chunk}))
+        )
+    }
+    chunk = [
+        dict(a, fatigue_score=state[a["driver_id"]].fatigue_score, health_status=state[a["driver_id"]].health_status)
+        for a in chunk
+    ]
+    
+    # Emails go out through the outbox once this transaction commits
+    db.execute(insert(models.EmailOutbox), [
+        email_service.outbox_row(a["email"], *email_service.route_assignment_email(
+            a["driver_name"], a["route_description"], a["grade"].name, a["explanation"]
+        ))
+        for a in chunk
+    ])
+    db.commit()
+    email_service.outbox_sender.notify()
+    
+    for a in chunk:
+        event_hub.publish(a["driver_id"], "assignment", {
+            "assignment_id": a["assignment_id"], "route_id": a["route_id"], "status": "PENDING"
+        })
+        event_hub.publish(a["driver_id"], "notification", {
+            "notification_id": a["notification_id"],
+            "title": f"New {a['grade'].name} Route Assigned",
+            "message": a["explanation"],
+            "notification_type": "route_assigned"
+        })
+    
+    return chunk
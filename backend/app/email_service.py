@@ -1,54 +1,149 @@
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+import queue
+import threading
 import os
 
+from . import models, database
+
 # Email Configuration
 SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
 SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
 SMTP_USERNAME = os.getenv("SMTP_USERNAME", "fairdispatch@example.com")
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "your_app_password")
+SMTP_USE_TLS = os.getenv("SMTP_USE_TLS", "true").lower() == "true"
 FROM_EMAIL = os.getenv("FROM_EMAIL", "fairdispatch@example.com")
 
+# "console" prints messages (demo), "smtp" delivers them through the connection pool
+EMAIL_DELIVERY = os.getenv("EMAIL_DELIVERY", "console")
+
+# Outbox sender
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "3"))
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "50"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "5"))
+EMAIL_RETRY_BASE_SECONDS = int(os.getenv("EMAIL_RETRY_BASE_SECONDS", "30"))
+EMAIL_POLL_SECONDS = float(os.getenv("EMAIL_POLL_SECONDS", "5"))
+
+# Messages stuck in SENDING this long (sender crashed) are retried
+EMAIL_CLAIM_TIMEOUT = timedelta(minutes=10)
+
+class SMTPConnectionPool:
+    """
+    Small pool of connected, authenticated SMTP sessions reused across messages
+    Idle connections are checked with NOOP before reuse and replaced if dead
+    """
+    
+    def __init__(self, size: int = SMTP_POOL_SIZE):
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+    
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=30)
+        if SMTP_USE_TLS:
+            server.starttls()
+        if SMTP_USERNAME and SMTP_PASSWORD:
+            server.login(SMTP_USERNAME, SMTP_PASSWORD)
+        return server
+    
+    @staticmethod
+    def _is_alive(server: smtplib.SMTP) -> bool:
+        try:
+            return server.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+    
+    @staticmethod
+    def _discard(server: smtplib.SMTP):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+    
+    @contextmanager
+    def connection(self):
+        self._slots.acquire()
+        server = None
+        try:
+            while server is None:
+                try:
+                    candidate = self._idle.get_nowait()
+                except queue.Empty:
+                    server = self._connect()
+                    break
+                if self._is_alive(candidate):
+                    server = candidate
+                else:
+                    self._discard(candidate)
+            
+            yield server
+            self._idle.put(server)
+        except Exception:
+            # The connection may be in an unknown state, don't reuse it
+            if server is not None:
+                self._discard(server)
+            raise
+        finally:
+            self._slots.release()
+    
+    def close(self):
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+smtp_pool = SMTPConnectionPool()
+
+def build_message(to_email: str, subject: str, body: str, html_body: str = None) -> MIMEMultipart:
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = subject
+    msg['From'] = FROM_EMAIL
+    msg['To'] = to_email
+    
+    text_part = MIMEText(body, 'plain')
+    msg.attach(text_part)
+    
+    if html_body:
+        html_part = MIMEText(html_body, 'html')
+        msg.attach(html_part)
+    
+    return msg
+
+def deliver_email(to_email: str, subject: str, body: str, html_body: str = None):
+    """Deliver one message now; raises on failure so the outbox can retry it"""
+    if EMAIL_DELIVERY == "smtp":
+        with smtp_pool.connection() as server:
+            server.send_message(build_message(to_email, subject, body, html_body))
+        return
+    
+    # For demo - just log
+    print(f"\n📧 EMAIL NOTIFICATION")
+    print(f"To: {to_email}")
+    print(f"Subject: {subject}")
+    print(f"Body: {body}\n")
+
 def send_email(to_email: str, subject: str, body: str, html_body: str = None):
     """
-    Send email notification to user
+    Send email notification to user right away, bypassing the outbox
     For demo purposes, this will print to console instead of actually sending
-    In production, configure with real SMTP credentials
+    Set EMAIL_DELIVERY=smtp and real SMTP credentials to deliver
     """
     try:
-        # For demo - just log
-        print(f"\n📧 EMAIL NOTIFICATION")
-        print(f"To: {to_email}")
-        print(f"Subject: {subject}")
-        print(f"Body: {body}\n")
-        
-        # Uncomment below for actual email sending
-        """
-        msg = MIMEMultipart('alternative')
-        msg['Subject'] = subject
-        msg['From'] = FROM_EMAIL
-        msg['To'] = to_email
-        
-        text_part = MIMEText(body, 'plain')
-        msg.attach(text_part)
-        
-        if html_body:
-            html_part = MIMEText(html_body, 'html')
-            msg.attach(html_part)
-        
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            server.starttls()
-            server.login(SMTP_USERNAME, SMTP_PASSWORD)
-            server.send_message(msg)
-        """
-        
+        deliver_email(to_email, subject, body, html_body)
         return True
     except Exception as e:
         print(f"❌ Email sending failed: {e}")
         return False
 
-def send_route_assignment_email(driver_email: str, driver_name: str, route_desc: str, grade: str, explanation: str):
+def route_assignment_email(driver_name: str, route_desc: str, grade: str, explanation: str):
+    """Subject, plain body and HTML body of a route assignment email"""
     subject = f"🚚 New Route Assignment - {grade} Grade"
     body = f"""
 Hello {driver_name},
@@ -93,4 +188,144 @@ FairDispatch AI Team
     </html>
     """
     
-    return send_email(driver_email, subject, body, html_body)
+    return subject, body, html_body
+
+# ============ OUTBOX ============
+
+def outbox_row(to_email: str, subject: str, body: str, html_body: str = None) -> dict:
+    """Column values of an outbox message, for bulk inserts"""
+    return {
+        "to_email": to_email,
+        "subject": subject,
+        "body": body,
+        "html_body": html_body,
+        "status": models.EmailStatus.PENDING
+    }
+
+def enqueue_email(db: Session, to_email: str, subject: str, body: str, html_body: str = None):
+    """
+    Queue an email in the caller's transaction; it is sent after commit by the outbox sender
+    Nothing is queued if the transaction rolls back
+    """
+    db.add(models.EmailOutbox(**outbox_row(to_email, subject, body, html_body)))
+
+def enqueue_route_assignment_email(db: Session, driver_email: str, driver_name: str, route_desc: str, grade: str, explanation: str):
+    subject, body, html_body = route_assignment_email(driver_name, route_desc, grade, explanation)
+    enqueue_email(db, driver_email, subject, body, html_body)
+
+def retry_delay(attempts: int) -> timedelta:
+    """Exponential backoff: base, 2x base, 4x base ... capped at one hour"""
+    return timedelta(seconds=min(EMAIL_RETRY_BASE_SECONDS * 2 ** (attempts - 1), 3600))
+
+class OutboxSender:
+    """
+    Background thread draining the email outbox in batches
+    Messages are claimed with a conditional UPDATE (PENDING -> SENDING) so several
+    workers can run senders without double-sending; failures retry with backoff
+    """
+    
+    def __init__(self):
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._senders = ThreadPoolExecutor(max_workers=SMTP_POOL_SIZE, thread_name_prefix="smtp")
+    
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="email-outbox", daemon=True)
+            self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        smtp_pool.close()
+    
+    def notify(self):
+        """New messages were committed, send them without waiting for the next poll"""
+        self._wake.set()
+    
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                sent = self.send_batch()
+            except Exception as e:
+                print(f"Email outbox error: {e}")
+                sent = 0
+            
+            # A full batch probably means more are waiting
+            if sent < EMAIL_BATCH_SIZE:
+                self._wake.wait(EMAIL_POLL_SECONDS)
+                self._wake.clear()
+    
+    def _claim_batch(self, db: Session):
+        now = datetime.now()
+        outbox = models.EmailOutbox
+        
+        # Recover messages abandoned by a crashed sender
+        db.execute(
+            update(outbox)
+            .where(outbox.status == models.EmailStatus.SENDING, outbox.claimed_at < now - EMAIL_CLAIM_TIMEOUT)
+            .values(status=models.EmailStatus.PENDING)
+        )
+        
+        due = db.query(outbox.id).filter(
+            outbox.status == models.EmailStatus.PENDING,
+            outbox.next_attempt_at <= now
+        ).order_by(outbox.id).limit(EMAIL_BATCH_SIZE).all()
+        
+        claimed = []
+        for (message_id,) in due:
+            result = db.execute(
+                update(outbox)
+                .where(outbox.id == message_id, outbox.status == models.EmailStatus.PENDING)
+                .values(status=models.EmailStatus.SENDING, claimed_at=now)
+            )
+            if result.rowcount == 1:
+                claimed.append(message_id)
+        db.commit()
+        
+        return db.query(outbox).filter(outbox.id.in_(claimed)).all() if claimed else []
+    
+    @staticmethod
+    def _deliver(message) -> str:
+        try:
+            deliver_email(message.to_email, message.subject, message.body, message.html_body)
+            return None
+        except Exception as e:
+            return str(e) or e.__class__.__name__
+    
+    def send_batch(self) -> int:
+        """Claim and send one batch of due messages; returns how many were claimed"""
+        db = database.BatchSessionLocal()
+        try:
+            messages = self._claim_batch(db)
+            if not messages:
+                return 0
+            
+            errors = list(self._senders.map(self._deliver, messages))
+            
+            now = datetime.now()
+            for message, error in zip(messages, errors):
+                message.claimed_at = None
+                if error is None:
+                    message.status = models.EmailStatus.SENT
+                    message.sent_at = now
+                    continue
+                
+                message.attempts = (message.attempts or 0) + 1
+                message.last_error = error
+                if message.attempts >= EMAIL_MAX_ATTEMPTS:
+                    message.status = models.EmailStatus.FAILED
+                    print(f"❌ Email to {message.to_email} failed permanently: {error}")
+                else:
+                    message.status = models.EmailStatus.PENDING
+                    message.next_attempt_at = now + retry_delay(message.attempts)
+            db.commit()
+            return len(messages)
+        finally:
+            db.close()
+
+outbox_sender = OutboxSender()
@@ -0,0 +1,147 @@
+"""
+Driver Event Hub
+In-process pub/sub behind the /events/{user_id} Server-Sent Events stream:
+writers publish "new notification" / "assignment changed" events per user after
+commit, connected drivers receive them instead of polling the list endpoints
+Events are kept per user for a while so a reconnecting client can resume from
+its Last-Event-ID; if that id is gone it gets a "resync" event and refetches
+"""
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import itertools
+import json
+import threading
+import uuid
+import os
+
+# Recent events kept per user for resuming after a reconnect
+EVENT_BACKLOG_PER_USER = int(os.getenv("EVENT_BACKLOG_PER_USER", "50"))
+
+# Undelivered events buffered per connection before it is told to resync
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "100"))
+
+# Comment line sent on idle streams so proxies keep the connection open
+EVENT_KEEPALIVE_SECONDS = float(os.getenv("EVENT_KEEPALIVE_SECONDS", "15"))
+
+class DriverEvent:
+    __slots__ = ("id", "seq", "user_id", "type", "data")
+    
+    def __init__(self, epoch: str, seq: int, user_id: int, event_type: str, data: dict):
+        self.id = f"{epoch}-{seq}"
+        self.seq = seq
+        self.user_id = user_id
+        self.type = event_type
+        self.data = data
+    
+    def to_sse(self) -> str:
+        return f"id: {self.id}\nevent: {self.type}\ndata: {json.dumps(self.data, default=str)}\n\n"
+
+class EventHub:
+    """
+    Thread-safe publisher (dispatch workers, sync endpoints) feeding
+    asyncio queues of the SSE connections on the event loop
+    Event ids are "<process epoch>-<sequence>"; an id from another process
+    or an earlier run cannot be resumed and triggers a resync
+    """
+    
+    def __init__(self):
+        self.epoch = uuid.uuid4().hex[:8]
+        self._seq = itertools.count(1)
+        self._lock = threading.Lock()
+        self._backlog: Dict[int, deque] = {}
+        self._subscribers: Dict[int, List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+    
+    def publish(self, user_id: int, event_type: str, data: dict):
+        """Record an event for a user and push it to their open streams; call after commit"""
+        with self._lock:
+            event = DriverEvent(self.epoch, next(self._seq), user_id, event_type, data)
+            self._backlog.setdefault(user_id, deque(maxlen=EVENT_BACKLOG_PER_USER)).append(event)
+            subscribers = list(self._subscribers.get(user_id, ()))
+        
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._deliver, queue, event)
+            except RuntimeError:
+                pass  # Loop already closed; the stream is going away
+    
+    @staticmethod
+    def _deliver(queue: asyncio.Queue, event: Optional[DriverEvent]):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Slow consumer: drop what is queued and have it refetch instead
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(None)
+    
+    def subscribe(self, user_id: int) -> asyncio.Queue:
+        """Queue receiving the user's events (None means resync); call on the event loop"""
+        queue = asyncio.Queue(maxsize=EVENT_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.setdefault(user_id, []).append((asyncio.get_running_loop(), queue))
+        return queue
+    
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue):
+        with self._lock:
+            remaining = [entry for entry in self._subscribers.get(user_id, []) if entry[1] is not queue]
+            if remaining:
+                self._subscribers[user_id] = remaining
+            else:
+                self._subscribers.pop(user_id, None)
+    
+    def replay(self, user_id: int, last_event_id: Optional[str]) -> Optional[List[DriverEvent]]:
+        """
+        Events after last_event_id, [] when there is nothing to resume from,
+        or None when the client missed events we no longer have (must resync)
+        """
+        if not last_event_id:
+            return []
+        
+        epoch, _, seq = last_event_id.partition("-")
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        seq = int(seq)
+        
+        with self._lock:
+            backlog = list(self._backlog.get(user_id, ()))
+        
+        # A full backlog may have dropped events newer than the client's last one
+        if len(backlog) == EVENT_BACKLOG_PER_USER and backlog[0].seq > seq:
+            return None
+        return [event for event in backlog if event.seq > seq]
+    
+    def connections(self) -> int:
+        with self._lock:
+            return sum(len(queues) for queues in self._subscribers.values())
+
+event_hub = EventHub()
+
+async def stream_events(user_id: int, last_event_id: Optional[str] = None):
+    """SSE body for one driver: missed events first, then live ones, with keepalives"""
+    queue = event_hub.subscribe(user_id)
+    try:
+        replayed = event_hub.replay(user_id, last_event_id)
+        last_seq = 0
+        if replayed is None:
+            yield "event: resync\ndata: {}\n\n"
+        else:
+            for event in replayed:
+                last_seq = event.seq
+                yield event.to_sse()
+        
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), EVENT_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            
+            if event is None:
+                yield "event: resync\ndata: {}\n\n"
+            elif event.seq > last_seq:
+                # Skip events already sent from the backlog
+                last_seq = event.seq
+                yield event.to_sse()
+    finally:
+        event_hub.unsubscribe(user_id, queue)
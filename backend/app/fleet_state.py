@@ -0,0 +1,269 @@
+"""
+Fleet State Cache
+Per-location in-memory copy of the driver, route and weekly policy rows that
+dispatch, reassignment and the admin dashboard read on every call. A location
+is hydrated once from the primary with a few column-only queries into compact
+__slots__ records, then kept current by the write paths (availability, route
+creation, accept/decline, dispatch, policy updates), each bumping its version
+Writes made by other processes only reach this cache through resync() or once
+an entry is FLEET_STATE_MAX_AGE_SECONDS old; dispatch, reassignment and the
+dashboard also check a one-query fingerprint of the location's rows and
+rehydrate when it moved. Local writes hand over the session that committed
+them, and the entry takes the new fingerprint, so they do not cause a rehydration
+"""
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from typing import Dict, List, Optional
+import threading
+import time
+import os
+
+from . import models, database
+
+# Upper bound on how long writes from other processes can go unseen (0 disables the cache)
+FLEET_STATE_MAX_AGE_SECONDS = float(os.getenv("FLEET_STATE_MAX_AGE_SECONDS", "300"))
+
+class FleetRecord:
+    """Attribute-compatible stand-in for an ORM row; treated as immutable, see replace()"""
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    @classmethod
+    def columns(cls, model) -> List:
+        return [getattr(model, name) for name in cls.__slots__]
+
+    @classmethod
+    def from_row(cls, row):
+        """Record of an ORM object (or any object with the same attributes)"""
+        return cls(*[getattr(row, name) for name in cls.__slots__])
+
+    def replace(self, **changes):
+        """Copy with some fields changed; readers holding the old record keep a consistent view"""
+        return type(self)(*[changes[name] if name in changes else getattr(self, name) for name in self.__slots__])
+
+class DriverRecord(FleetRecord):
+    __slots__ = (
+        "id", "name", "email", "employee_id", "role", "location_id", "is_available",
+        "fatigue_score", "health_status", "credits", "bonus_credits"
+    )
+
+class RouteRecord(FleetRecord):
+    __slots__ = (
+        "id", "location_id", "description", "area", "start_lat", "start_lng", "end_lat", "end_lng",
+        "grade", "package_count", "has_elevator", "stairs_count", "parking_difficulty", "traffic_level",
+        "is_assigned"
+    )
+
+class PolicyRecord(FleetRecord):
+    __slots__ = (
+        "id", "location_id", "easy_routes_target", "medium_routes_target", "hard_routes_target",
+        "easy_route_credits", "medium_route_credits", "hard_route_credits",
+        "max_consecutive_hard_routes", "min_rest_days_after_hard", "fatigue_threshold_for_restriction"
+    )
+
+    def credits_for(self, grade: models.RouteGrade) -> int:
+        if grade == models.RouteGrade.EASY:
+            return self.easy_route_credits
+        if grade == models.RouteGrade.MEDIUM:
+            return self.medium_route_credits
+        return self.hard_route_credits
+
+def fingerprint_select(location_id: str):
+    """One row that moves whenever a user, route or policy of the location is added or changed"""
+    def of_location(aggregate, model):
+        return select(aggregate).where(model.location_id == location_id).scalar_subquery()
+
+    return select(
+        of_location(func.count(models.User.id), models.User),
+        of_location(func.max(models.User.updated_at), models.User),
+        of_location(func.count(models.Route.id), models.Route),
+        of_location(func.max(models.Route.updated_at), models.Route),
+        of_location(func.max(models.WeeklyPolicy.updated_at), models.WeeklyPolicy)
+    )
+
+class LocationFleet:
+    """Drivers (all users of the location), routes and policy of one location"""
+
+    def __init__(self, location_id: str, drivers: Dict[int, DriverRecord], routes: Dict[int, RouteRecord],
+                 policy: Optional[PolicyRecord], fingerprint: tuple):
+        self.location_id = location_id
+        self.drivers = drivers
+        self.routes = routes
+        self.policy = policy
+        self.fingerprint = fingerprint
+        self.version = 0  # Set from FleetState's generation: only ever grows, also across rehydrations
+        self.hydrated_at = time.monotonic()
+
+    # Readers copy the values first: write paths may add entries concurrently
+
+    def available_drivers(self, exclude_driver_id: int = None, exclude_restricted: bool = False) -> List[DriverRecord]:
+        return [
+            d for d in list(self.drivers.values())
+            if d.is_available and d.id != exclude_driver_id
+            and not (exclude_restricted and d.health_status == models.HealthStatus.RESTRICTED)
+        ]
+
+    def open_routes(self) -> List[RouteRecord]:
+        return [r for r in list(self.routes.values()) if not r.is_assigned]
+
+class FleetState:
+    """Process-wide cache of LocationFleet entries"""
+
+    def __init__(self):
+        self._fleets: Dict[str, LocationFleet] = {}
+        self._lock = threading.Lock()
+        # Bumped by every hydration, change and resync; a hydration that raced with a write is not cached
+        self._generation = 0
+        self.hits = 0
+        self.hydrations = 0
+
+    def get(self, location_id: str, validate_db: Session = None) -> LocationFleet:
+        """
+        Cached fleet of a location, hydrated on first use or once too old
+        With validate_db, one fingerprint query decides whether the entry is still current
+        """
+        now = time.monotonic()
+        with self._lock:
+            fleet = self._fleets.get(location_id)
+        if fleet is not None and now - fleet.hydrated_at > FLEET_STATE_MAX_AGE_SECONDS:
+            fleet = None
+        if fleet is not None and validate_db is not None:
+            if tuple(validate_db.execute(fingerprint_select(location_id)).one()) != fleet.fingerprint:
+                fleet = None
+        if fleet is not None:
+            self.hits += 1
+            return fleet
+
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+        fleet = self._hydrate(location_id)
+        with self._lock:
+            self.hydrations += 1
+            fleet.version = generation
+            if generation == self._generation:
+                self._fleets[location_id] = fleet
+        return fleet
+
+    def _hydrate(self, location_id: str) -> LocationFleet:
+        db = database.SessionLocal()
+        try:
+            # Fingerprint first: a write landing mid-hydration then fails the next validation
+            fingerprint = tuple(db.execute(fingerprint_select(location_id)).one())
+            drivers = {
+                row.id: DriverRecord(*row)
+                for row in db.execute(
+                    select(*DriverRecord.columns(models.User))
+                    .where(models.User.location_id == location_id).order_by(models.User.id)
+                )
+            }
+            routes = {
+                row.id: RouteRecord(*row)
+                for row in db.execute(
+                    select(*RouteRecord.columns(models.Route))
+                    .where(models.Route.location_id == location_id).order_by(models.Route.id)
+                )
+            }
+            policy_row = db.execute(
+                select(*PolicyRecord.columns(models.WeeklyPolicy))
+                .where(models.WeeklyPolicy.location_id == location_id).order_by(models.WeeklyPolicy.id).limit(1)
+            ).first()
+        finally:
+            db.close()
+        return LocationFleet(location_id, drivers, routes, PolicyRecord(*policy_row) if policy_row else None, fingerprint)
+
+    def _change(self, location_id: str, apply, db: Session = None):
+        """
+        Run apply(fleet) on the cached entry, if any, and bump its version
+        db is the session that just committed the write: the entry takes the location's
+        fingerprint read through it, which includes the write (one query, only when cached)
+        A write another process commits in that short window is then left to the max age
+        """
+        fingerprint = None
+        if db is not None and location_id in self._fleets:
+            fingerprint = tuple(db.execute(fingerprint_select(location_id)).one())
+        with self._lock:
+            self._generation += 1
+            fleet = self._fleets.get(location_id)
+            if fleet is not None:
+                apply(fleet)
+                fleet.version = self._generation
+                if fingerprint is not None:
+                    fleet.fingerprint = fingerprint
+
+    def update_driver(self, location_id: str, driver_id: int, db: Session = None, **changes):
+        def apply(fleet):
+            record = fleet.drivers.get(driver_id)
+            if record is not None:
+                fleet.drivers[driver_id] = record.replace(**changes)
+        self._change(location_id, apply, db)
+
+    def add_driver(self, user: models.User, db: Session = None):
+        def apply(fleet):
+            fleet.drivers[user.id] = DriverRecord.from_row(user)
+        self._change(user.location_id, apply, db)
+
+    def add_route(self, route: models.Route, db: Session = None):
+        def apply(fleet):
+            fleet.routes[route.id] = RouteRecord.from_row(route)
+        self._change(route.location_id, apply, db)
+
+    def update_route(self, location_id: str, route_id: int, db: Session = None, **changes):
+        def apply(fleet):
+            record = fleet.routes.get(route_id)
+            if record is not None:
+                fleet.routes[route_id] = record.replace(**changes)
+        self._change(location_id, apply, db)
+
+    def apply_dispatch(self, location_id: str, written: List[dict], db: Session = None):
+        """Routes claimed and driver fatigue/health after a committed dispatch chunk"""
+        def apply(fleet):
+            for a in written:
+                route = fleet.routes.get(a["route_id"])
+                if route is not None:
+                    fleet.routes[a["route_id"]] = route.replace(is_assigned=True)
+                driver = fleet.drivers.get(a["driver_id"])
+                if driver is not None:
+                    fleet.drivers[a["driver_id"]] = driver.replace(
+                        fatigue_score=a["fatigue_score"], health_status=a["health_status"]
+                    )
+        self._change(location_id, apply, db)
+
+    def set_policy(self, policy: models.WeeklyPolicy, db: Session = None):
+        def apply(fleet):
+            fleet.policy = PolicyRecord.from_row(policy)
+        self._change(policy.location_id, apply, db)
+
+    def resync(self, location_id: Optional[str] = None):
+        """Drop a location (or every location); the next read hydrates it from the database"""
+        with self._lock:
+            self._generation += 1
+            if location_id is None:
+                self._fleets.clear()
+            else:
+                self._fleets.pop(location_id, None)
+
+    def status(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            fleets = list(self._fleets.values())
+        return {
+            "max_age_seconds": FLEET_STATE_MAX_AGE_SECONDS,
+            "hits": self.hits,
+            "hydrations": self.hydrations,
+            "locations": {
+                f.location_id: {
+                    "version": f.version,
+                    "drivers": len(f.drivers),
+                    "routes": len(f.routes),
+                    "open_routes": len(f.open_routes()),
+                    "age_seconds": round(now - f.hydrated_at, 1)
+                }
+                for f in fleets
+            }
+        }
+
+fleet_state = FleetState()
@@ -8,6 +8,17 @@ from datetime import datetime, timedelta
 import math
 import random
 from typing import List, Tuple, Dict
+import os
+
+# Pair selection strategy: "greedy" (top-3 rounds) or "optimal" (global assignment)
+SOLVERS = ("greedy", "optimal")
+DISPATCH_SOLVER = os.getenv("DISPATCH_SOLVER", "greedy")
+
+# Pairs must score above this to be assigned
+MIN_ASSIGNMENT_SCORE = 40
+
+# location_id -> (fleet version, drivers, spatial index) of the available, unrestricted drivers
+_driver_indexes: Dict[str, tuple] = {}
 
 def calculate_distance(lat1, lon1, lat2, lon2):
     """Calculate distance between two GPS coordinates in km using Haversine formula"""
@@ -40,10 +51,44 @@ def get_driver_current_location(driver: User) -> Tuple[float, float]:
     
     return (base_lat + offset_lat, base_lng + offset_lng)
 
-def calculate_driver_route_compatibility(driver: User, route: Route, db: Session) -> Dict:
+def find_nearest_drivers(fleet, lat: float, lng: float, k: int = 1, exclude_driver_id: int = None) -> List[Tuple[User, float]]:
+    """
+    k available, unrestricted drivers of a LocationFleet closest to a point (e.g. a route start)
+    as (driver, distance_km), nearest first
+    The spatial index is built once per fleet version, so repeated lookups skip the O(D) build
+    """
+    from .spatial_index import build_driver_index
+    
+    cached = _driver_indexes.get(fleet.location_id)
+    if cached is None or cached[0] != fleet.version:
+        version = fleet.version  # Read before the drivers: a concurrent change then forces a rebuild
+        drivers = fleet.available_drivers(exclude_restricted=True)
+        cached = (version, drivers, build_driver_index(drivers))
+        _driver_indexes[fleet.location_id] = cached
+    
+    _, drivers, index = cached
+    found = [(drivers[i], distance) for i, distance in index.nearest(lat, lng, k + 1)]
+    return [(d, distance) for d, distance in found if d.id != exclude_driver_id][:k]
+
+def calculate_driver_route_compatibility(driver: User, route: Route, db: Session, weekly_balance: Dict = None) -> Dict:
     """
     Calculate how well a driver matches a route
     Returns a compatibility score (0-100) and detailed reasoning
+    Pass a preloaded weekly_balance (see balance_service) to skip the balance query
+    """
+    if weekly_balance is None:
+        from .logic import get_weekly_balance
+        weekly_balance = get_weekly_balance(driver, db)
+    
+    driver_lat, driver_lng = get_driver_current_location(driver)
+    distance_to_start = calculate_distance(driver_lat, driver_lng, route.start_lat, route.start_lng)
+    
+    return score_driver_route(driver, route, weekly_balance, distance_to_start, datetime.now().hour)
+
+def score_driver_route(driver: User, route: Route, weekly_balance: Dict, distance_to_start: float, current_hour: int) -> Dict:
+    """
+    Scalar scoring rules shared by the per-pair path and the matrix engine
+    The vectorized engine in scoring_engine.py must stay in sync with these rules
     """
     score = 50  # Base score
     reasons = []
@@ -51,9 +96,6 @@ def calculate_driver_route_compatibility(driver: User, route: Route, db: Session
     bonuses = []
     
     # 1. GEOLOCATION PROXIMITY (Most Important - 30 points)
-    driver_lat, driver_lng = get_driver_current_location(driver)
-    distance_to_start = calculate_distance(driver_lat, driver_lng, route.start_lat, route.start_lng)
-    
     if distance_to_start < 2:  # Within 2km
         proximity_bonus = 30
         bonuses.append(f"Very close to route start ({distance_to_start:.1f}km)")
@@ -116,9 +158,6 @@ def calculate_driver_route_compatibility(driver: User, route: Route, db: Session
             penalties.append("High fatigue, hard route not recommended")
     
     # 4. WEEKLY BALANCE (15 points)
-    from .logic import get_weekly_balance
-    weekly_balance = get_weekly_balance(driver, db)
-    
     # Check if driver needs this type of route
     if route.grade == RouteGrade.HARD:
         if weekly_balance[RouteGrade.HARD] < 2:
@@ -171,7 +210,6 @@ def calculate_driver_route_compatibility(driver: User, route: Route, db: Session
             penalties.append("Difficult parking area")
     
     # 7. TIME OF DAY CONSIDERATION (Bonus)
-    current_hour = datetime.now().hour
     if 6 <= current_hour <= 10:  # Morning rush
         if route.traffic_level < 0.5:
             score += 5
@@ -196,7 +234,10 @@ def intelligent_route_assignment(
     drivers: List[User],
     routes: List[Route],
     db: Session,
-    policy
+    policy,
+    solver: str = None,
+    weekly_balances: Dict = None,
+    location_id: str = None
 ) -> List[Tuple[User, Route, str, str]]:
     """
     Intelligent AI-powered route assignment
@@ -208,62 +249,121 @@ def intelligent_route_assignment(
     3. Balances workload fairly
     4. Matches skills to route difficulty
     5. Optimizes for efficiency and driver wellbeing
+    
+    solver selects how pairs are picked from the compatibility matrix:
+    - "greedy": best pair among the 3 most urgent routes, one round at a time
+    - "optimal": one global linear assignment maximizing the total score
+    
+    weekly_balances is the preloaded {driver_id: balance} dict from balance_service;
+    it is loaded here in one query when not given
+    
+    With location_id, the location's previous matrix is reused and only pairs whose
+    driver or route changed since are rescored (see score_cache.matrix_cache)
     """
+    from .balance_service import get_weekly_balances
+    from .scoring_engine import build_compatibility_matrix
+    from .score_cache import matrix_cache
+    
+    solver = solver or DISPATCH_SOLVER
+    if solver not in SOLVERS:
+        raise ValueError(f"Unknown dispatch solver '{solver}', expected one of {', '.join(SOLVERS)}")
+    
+    # Score every driver against every route once, up front
+    if weekly_balances is None:
+        weekly_balances = get_weekly_balances(db, driver_ids=[driver.id for driver in drivers])
+    previous = matrix_cache.get(location_id) if location_id is not None else None
+    matrix = build_compatibility_matrix(drivers, routes, weekly_balances, previous=previous)
+    if location_id is not None:
+        matrix_cache.put(location_id, matrix)
+    
+    if solver == "optimal":
+        pairs = _optimal_pairs(matrix)
+    else:
+        pairs = _greedy_pairs(matrix)
+    
     assignments = []
-    available_drivers = drivers.copy()
-    available_routes = routes.copy()
+    for i, j in pairs:
+        driver, route = drivers[i], routes[j]
+        compatibility = matrix.compatibility(i, j)
+        
+        # Generate human-like explanation
+        explanation = generate_intelligent_explanation(driver, route, compatibility)
+        
+        # Determine reason code
+        reason_code = determine_reason_code(driver, route, compatibility)
+        
+        assignments.append((driver, route, explanation, reason_code))
+    
+    return assignments
+
+def _greedy_pairs(matrix) -> List[Tuple[int, int]]:
+    """Round-by-round greedy matching over the 3 most urgent open routes"""
+    import numpy as np
+    
+    drivers, routes = matrix.drivers, matrix.routes
+    pairs = []
     
     # Sort routes by urgency (hard routes first, then by distance)
-    available_routes.sort(key=lambda r: (
-        -r.grade.value,  # Hard routes first
-        -r.package_count  # More packages = higher priority
+    available_routes = sorted(range(len(routes)), key=lambda j: (
+        -routes[j].grade.value,  # Hard routes first
+        -routes[j].package_count  # More packages = higher priority
     ))
+    driver_open = np.ones(len(drivers), dtype=bool)
+    
+    # Seed from the stdlib RNG so random.seed() still makes runs reproducible
+    rng = np.random.default_rng(random.getrandbits(32))
     
     iteration = 0
     max_iterations = len(drivers) * 2  # Prevent infinite loops
     
-    while available_routes and available_drivers and iteration < max_iterations:
+    while available_routes and driver_open.any() and iteration < max_iterations:
         iteration += 1
-        best_match = None
-        best_score = -1
-        best_compatibility = None
         
         # For each route, find the best driver
-        for route in available_routes[:3]:  # Consider top 3 routes
-            for driver in available_drivers:
-                # Calculate compatibility
-                compatibility = calculate_driver_route_compatibility(driver, route, db)
-                
-                # Add randomness for human-like decision making (±5 points)
-                adjusted_score = compatibility["score"] + random.uniform(-5, 5)
-                
-                if adjusted_score > best_score:
-                    best_score = adjusted_score
-                    best_match = (driver, route)
-                    best_compatibility = compatibility
+        candidate_routes = available_routes[:3]  # Consider top 3 routes
+        candidate_drivers = np.flatnonzero(driver_open)
+        
+        # Rows are routes so argmax keeps the route-major tie-breaking of the scalar loop
+        candidate_scores = matrix.scores[np.ix_(candidate_drivers, candidate_routes)].T
+        
+        # Add randomness for human-like decision making (±5 points)
+        adjusted_scores = candidate_scores + rng.uniform(-5, 5, size=candidate_scores.shape)
+        
+        route_pos, driver_pos = np.unravel_index(np.argmax(adjusted_scores), adjusted_scores.shape)
         
         # If we found a good match (score > 40), make the assignment
-        if best_match and best_score > 40:
-            driver, route = best_match
-            
-            # Generate human-like explanation
-            explanation = generate_intelligent_explanation(
-                driver, route, best_compatibility
-            )
-            
-            # Determine reason code
-            reason_code = determine_reason_code(driver, route, best_compatibility)
-            
-            assignments.append((driver, route, explanation, reason_code))
+        if adjusted_scores[route_pos, driver_pos] > MIN_ASSIGNMENT_SCORE:
+            i = int(candidate_drivers[driver_pos])
+            j = candidate_routes[route_pos]
+            pairs.append((i, j))
             
             # Remove assigned driver and route
-            available_drivers.remove(driver)
-            available_routes.remove(route)
+            driver_open[i] = False
+            available_routes.remove(j)
         else:
             # No good match found, break to avoid poor assignments
             break
     
-    return assignments
+    return pairs
+
+def _optimal_pairs(matrix) -> List[Tuple[int, int]]:
+    """
+    Globally optimal matching: maximize the summed score in one assignment solve
+    Pairs at or below the score threshold cost nothing, so taking them is never
+    better than leaving the driver free, and they are dropped afterwards
+    """
+    import numpy as np
+    from scipy.optimize import linear_sum_assignment
+    
+    eligible = matrix.scores > MIN_ASSIGNMENT_SCORE
+    cost = np.where(eligible, -matrix.scores, 0)
+    rows, cols = linear_sum_assignment(cost)
+    
+    # Most urgent routes first, matching the greedy output order
+    pairs = [(int(i), int(j)) for i, j in zip(rows, cols) if eligible[i, j]]
+    routes = matrix.routes
+    pairs.sort(key=lambda p: (-routes[p[1]].grade.value, -routes[p[1]].package_count))
+    return pairs
 
 def generate_intelligent_explanation(driver: User, route: Route, compatibility: Dict) -> str:
     """Generate human-like explanation for route assignment"""
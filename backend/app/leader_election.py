@@ -0,0 +1,103 @@
+"""
+Leader Election
+DB-backed lease so exactly one process (e.g. one of several uvicorn workers)
+runs singleton background jobs like the auto-dispatch scheduler
+Works on MySQL and the SQLite fallback: acquisition is a conditional UPDATE
+"""
+from sqlalchemy import update, or_
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timedelta
+import os
+import socket
+import uuid
+
+from . import models, database
+
+# A leader that stops renewing loses the lease after this many seconds
+LEASE_TTL_SECONDS = int(os.getenv("SCHEDULER_LEASE_TTL_SECONDS", "30"))
+
+class LeaderLease:
+    """
+    Named lease held by at most one process at a time
+    The holder renews it every ttl/3 seconds; once it expires any standby can take it,
+    so failover happens within ttl + ttl/3 seconds. Hosts' clocks must agree to well under ttl
+    """
+
+    def __init__(self, name: str, ttl_seconds: int = LEASE_TTL_SECONDS):
+        self.name = name
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._held_until = None
+
+    @property
+    def renew_interval(self) -> float:
+        return self.ttl.total_seconds() / 3
+
+    @property
+    def is_leader(self) -> bool:
+        """True while our last successful acquire/renew has not expired"""
+        return self._held_until is not None and datetime.now() < self._held_until
+
+    def try_acquire(self) -> bool:
+        """Acquire the lease, or renew it if we already hold it. Blocking; run off the event loop"""
+        now = datetime.now()
+        expires_at = now + self.ttl
+        lease = models.SchedulerLease
+
+        db = database.SessionLocal()
+        try:
+            result = db.execute(
+                update(lease)
+                .where(
+                    lease.name == self.name,
+                    or_(lease.holder == self.holder, lease.expires_at < now)
+                )
+                .values(holder=self.holder, expires_at=expires_at)
+            )
+            acquired = result.rowcount == 1
+
+            if not acquired and db.get(lease, self.name) is None:
+                # First process ever to ask for this lease
+                db.add(lease(name=self.name, holder=self.holder, expires_at=expires_at, acquired_at=now))
+                acquired = True
+
+            if acquired and not self.is_leader:
+                db.execute(update(lease).where(lease.name == self.name).values(acquired_at=now))
+
+            db.commit()
+        except IntegrityError:
+            # Another process inserted the row first
+            db.rollback()
+            acquired = False
+        finally:
+            db.close()
+
+        self._held_until = expires_at if acquired else None
+        return acquired
+
+    def renew_if_due(self) -> bool:
+        """
+        Heartbeat for long-running holders: renew once renew_interval passed since the
+        last acquire/renew. False if the lease expired and another process took it
+        """
+        if self._held_until is not None and self._held_until - datetime.now() > self.ttl - timedelta(seconds=self.renew_interval):
+            return True
+        return self.try_acquire()
+
+    def release(self):
+        """Give the lease up so a standby can take over immediately"""
+        if self._held_until is None:
+            return
+        lease = models.SchedulerLease
+
+        db = database.SessionLocal()
+        try:
+            db.execute(
+                update(lease)
+                .where(lease.name == self.name, lease.holder == self.holder)
+                .values(expires_at=datetime.now())
+            )
+            db.commit()
+        finally:
+            db.close()
+        self._held_until = None
@@ -1,7 +1,8 @@
-from .models import Route, User, RouteGrade, HealthStatus, Assignment, AssignmentStatus, Notification, WeeklyPolicy
+from .models import Route, User, RouteGrade, Notification, WeeklyPolicy
 from sqlalchemy.orm import Session
+from .event_hub import event_hub
+from .fleet_state import fleet_state
 import random
-from datetime import datetime, timedelta
 import math
 
 def calculate_distance(lat1, lon1, lat2, lon2):
@@ -178,19 +179,9 @@ def calculate_route_grade(route: Route) -> tuple[RouteGrade, str, int, int]:
 
 def get_weekly_balance(driver: User, db: Session):
     """Calculate counts of Easy, Medium, Hard routes in last 7 days"""
-    one_week_ago = datetime.now() - timedelta(days=7)
-    recent_assignments = db.query(Assignment).filter(
-        Assignment.driver_id == driver.id,
-        Assignment.assigned_date >= one_week_ago,
-        Assignment.status.in_([AssignmentStatus.ACCEPTED, AssignmentStatus.COMPLETED])
-    ).all()
-    
-    counts = {RouteGrade.EASY: 0, RouteGrade.MEDIUM: 0, RouteGrade.HARD: 0}
-    for a in recent_assignments:
-        if a.route:
-            counts[a.route.grade] += 1
-            
-    return counts
+    # Prefer balance_service.get_weekly_balances when scoring many drivers
+    from .balance_service import get_weekly_balances, balance_for
+    return balance_for(get_weekly_balances(db, driver_ids=[driver.id]), driver.id)
 
 def generate_explanation(driver: User, route_grade: RouteGrade, reason_code: str, weekly_balance: dict):
     """Generate human-friendly explanation for route assignment"""
@@ -241,17 +232,19 @@ def create_notification(db: Session, user_id: int, title: str, message: str, not
     )
     db.add(notification)
     db.commit()
+    
+    # Pushed to the user's open /events stream
+    event_hub.publish(user_id, "notification", {
+        "notification_id": notification.id,
+        "title": title,
+        "message": message,
+        "notification_type": notification_type
+    })
     return notification
 
 def find_available_drivers(db: Session, location_id: str, exclude_driver_id: int = None):
-    """Find available drivers for reassignment"""
-    query = db.query(User).filter(
-        User.location_id == location_id,
-        User.is_available == True,
-        User.health_status != HealthStatus.RESTRICTED
-    )
-    
-    if exclude_driver_id:
-        query = query.filter(User.id != exclude_driver_id)
-    
-    return query.all()
+    """
+    Find available drivers for reassignment (fleet state records, not ORM rows)
+    Checked against the database first, so a driver another process took off duty is not picked
+    """
+    return fleet_state.get(location_id, validate_db=db).available_drivers(exclude_driver_id, exclude_restricted=True)
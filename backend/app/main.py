@@ -1,13 +1,25 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Header, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from typing import List, Optional
 from datetime import datetime, timedelta
-from . import models, schemas, crud, database, logic, email_service, pdf_service
+from . import models, schemas, crud, database, logic, email_service, dashboard_service, dispatch_service, dispatch_jobs, scheduler, pagination, replica_router, event_hub, sync_service, score_cache, pdf_service
+from .fleet_state import fleet_state
 import random
 import asyncio
+import os
 
-models.Base.metadata.create_all(bind=database.engine)
+# Create missing tables at startup; deployments that run create_schema.py as a migration step can turn this off
+DB_CREATE_SCHEMA_ON_STARTUP = os.getenv("DB_CREATE_SCHEMA_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+
+def init_database(create_schema: bool = DB_CREATE_SCHEMA_ON_STARTUP):
+    """Connect (MySQL or the SQLite fallback) and optionally create missing tables"""
+    engine = database.init_db()
+    if create_schema:
+        models.Base.metadata.create_all(bind=engine)
 
 app = FastAPI(
     title="FairDispatch AI API",
@@ -22,6 +34,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[pagination.NEXT_CURSOR_HEADER, "ETag", replica_router.PRIMARY_UNTIL_HEADER],
 )
 
 # Dependency
@@ -32,14 +45,39 @@ def get_db():
     finally:
         db.close()
 
+# Async dependency for the high-traffic driver-facing reads
+get_async_db = database.get_async_db
+
+# Read-only endpoints: a replica within the stale-read tolerance, or the primary
+# for clients that just wrote (read-your-writes)
+def get_read_db(request: Request):
+    engine = replica_router.replica_router.sync_engine(replica_router.wants_primary(request))
+    db = database.SessionLocal(bind=engine)
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_read_db(request: Request):
+    engine = replica_router.replica_router.async_engine(replica_router.wants_primary(request))
+    async with database.AsyncSessionLocal(bind=engine) as db:
+        yield db
+
+@app.middleware("http")
+async def pin_writers_to_primary(request: Request, call_next):
+    response = await call_next(request)
+    if database.DATABASE_REPLICA_URLS and request.method in replica_router.WRITE_METHODS and response.status_code < 400:
+        replica_router.mark_write(response)
+    return response
+
 # ============ AUTHENTICATION ENDPOINTS ============
 
 @app.post("/auth/admin/login", response_model=schemas.LoginResponse)
-def admin_login(credentials: schemas.AdminLogin, db: Session = Depends(get_db)):
+async def admin_login(credentials: schemas.AdminLogin, db: AsyncSession = Depends(get_async_db)):
     """Admin login using location_id, year, and DOB"""
-    admin = db.query(models.Admin).filter(
-        models.Admin.location_id == credentials.location_id
-    ).first()
+    admin = (await db.execute(
+        select(models.Admin).filter(models.Admin.location_id == credentials.location_id).limit(1)
+    )).scalars().first()
     
     if not admin:
         return schemas.LoginResponse(success=False, message="Invalid location ID")
@@ -56,11 +94,11 @@ def admin_login(credentials: schemas.AdminLogin, db: Session = Depends(get_db)):
     )
 
 @app.post("/auth/driver/login", response_model=schemas.LoginResponse)
-def driver_login(credentials: schemas.DriverLogin, db: Session = Depends(get_db)):
+async def driver_login(credentials: schemas.DriverLogin, db: AsyncSession = Depends(get_async_db)):
     """Driver/Dispatcher login using employee_id and password"""
-    user = db.query(models.User).filter(
-        models.User.employee_id == credentials.employee_id
-    ).first()
+    user = (await db.execute(
+        select(models.User).filter(models.User.employee_id == credentials.employee_id).limit(1)
+    )).scalars().first()
     
     if not user:
         return schemas.LoginResponse(success=False, message="Invalid employee ID")
@@ -88,20 +126,27 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
         if existing:
             raise HTTPException(status_code=400, detail="Employee ID already exists")
     
-    return crud.create_user(db=db, user=user)
+    db_user = crud.create_user(db=db, user=user)
+    fleet_state.add_driver(db_user, db)
+    return db_user
 
 @app.get("/users/", response_model=List[schemas.UserResponse])
-def get_users(location_id: str = None, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Get all users, optionally filtered by location"""
-    query = db.query(models.User)
+def get_users(request: Request, response: Response, location_id: str = None, cursor: str = None, limit: int = None, db: Session = Depends(get_read_db)):
+    """Get all users, optionally filtered by location (next page: X-Next-Cursor; 304 on If-None-Match)"""
+    filters = []
     if location_id:
-        query = query.filter(models.User.location_id == location_id)
-    return query.offset(skip).limit(limit).all()
+        filters.append(models.User.location_id == location_id)
+    
+    versions = db.execute(sync_service.versions_select(models.User, filters)).one()
+    cached = sync_service.not_modified(request, response, versions)
+    if cached:
+        return cached
+    return pagination.paginate(db.query(models.User).filter(*filters), [models.User.id], response, cursor, limit)
 
 @app.get("/users/{user_id}", response_model=schemas.UserResponse)
-def get_user(user_id: int, db: Session = Depends(get_db)):
+async def get_user(user_id: int, db: AsyncSession = Depends(get_async_read_db)):
     """Get specific user details"""
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+    user = await db.get(models.User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
@@ -113,12 +158,33 @@ def update_availability(user_id: int, is_available: bool, reason: str = None, db
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
+    was_available = user.is_available
     user.is_available = is_available
     if not is_available and reason:
         user.exemption_reason = reason
     
     db.commit()
-    return {"message": "Availability updated", "is_available": is_available}
+    fleet_state.update_driver(user.location_id, user.id, db, is_available=is_available)
+    dashboard_service.invalidate(user.location_id)
+    
+    # Back on duty after today's run: offer them the best open route now
+    assigned = None
+    if is_available and not was_available:
+        assigned = _dispatch_incrementally(db, dispatch_service.dispatch_available_driver, user.location_id, user_id)
+    return {
+        "message": "Availability updated",
+        "is_available": is_available,
+        "assigned_route_id": assigned["route_id"] if assigned else None
+    }
+
+def _dispatch_incrementally(db: Session, place, location_id: str, item_id: int):
+    """Run an incremental dispatch step; a failure only leaves the item for the next full run"""
+    try:
+        return place(db, location_id, item_id)
+    except Exception as e:
+        db.rollback()
+        print(f"Incremental dispatch failed for {location_id}/{item_id}: {e}")
+        return None
 
 # ============ ROUTE ENDPOINTS ============
 
@@ -151,40 +217,64 @@ def create_route(route: schemas.RouteCreate, db: Session = Depends(get_db)):
     db.add(db_route)
     db.commit()
     db.refresh(db_route)
+    fleet_state.add_route(db_route, db)
+    
+    # Posted after today's run: place it now rather than at the next full dispatch
+    _dispatch_incrementally(db, dispatch_service.dispatch_new_route, db_route.location_id, db_route.id)
     return db_route
 
 @app.get("/routes/", response_model=List[schemas.RouteResponse])
-def get_routes(location_id: str = None, is_assigned: bool = None, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Get routes, optionally filtered"""
-    query = db.query(models.Route)
+def get_routes(request: Request, response: Response, location_id: str = None, is_assigned: bool = None, cursor: str = None, limit: int = None, db: Session = Depends(get_read_db)):
+    """Get routes, optionally filtered (next page: X-Next-Cursor; 304 on If-None-Match)"""
+    filters = []
     if location_id:
-        query = query.filter(models.Route.location_id == location_id)
+        filters.append(models.Route.location_id == location_id)
     if is_assigned is not None:
-        query = query.filter(models.Route.is_assigned == is_assigned)
-    return query.offset(skip).limit(limit).all()
+        filters.append(models.Route.is_assigned == is_assigned)
+    
+    versions = db.execute(sync_service.versions_select(models.Route, filters)).one()
+    cached = sync_service.not_modified(request, response, versions)
+    if cached:
+        return cached
+    return pagination.paginate(
+        db.query(models.Route).filter(*filters), [models.Route.created_at, models.Route.id], response, cursor, limit
+    )
 
 # ============ ASSIGNMENT ENDPOINTS ============
 
 @app.get("/assignments/", response_model=List[schemas.AssignmentResponse])
-def get_assignments(driver_id: int = None, status: str = None, db: Session = Depends(get_db)):
-    """Get assignments, optionally filtered by driver or status"""
-    query = db.query(models.Assignment)
+async def get_assignments(request: Request, response: Response, driver_id: int = None, status: str = None, cursor: str = None, limit: int = None, db: AsyncSession = Depends(get_async_read_db)):
+    """Get assignments newest first, optionally filtered by driver or status (next page: X-Next-Cursor; 304 on If-None-Match)"""
+    filters = []
     if driver_id:
-        query = query.filter(models.Assignment.driver_id == driver_id)
+        filters.append(models.Assignment.driver_id == driver_id)
     if status:
-        query = query.filter(models.Assignment.status == status)
-    return query.order_by(models.Assignment.assigned_date.desc()).all()
+        filters.append(models.Assignment.status == status)
+    
+    # The embedded route is part of the payload, so its changes count too
+    versions = (await db.execute(sync_service.versions_select(models.Assignment, filters, models.Assignment.route))).one()
+    cached = sync_service.not_modified(request, response, versions)
+    if cached:
+        return cached
+    return await pagination.paginate_async(
+        db, crud.assignments_select().filter(*filters), [models.Assignment.assigned_date, models.Assignment.id],
+        response, cursor, limit, descending=True
+    )
 
 @app.post("/assignments/{assignment_id}/respond")
 def respond_to_assignment(assignment_id: int, action: schemas.AssignmentAction, db: Session = Depends(get_db)):
     """Driver accepts or declines assignment"""
-    assignment = db.query(models.Assignment).filter(models.Assignment.id == assignment_id).first()
+    assignment = crud.get_assignment(db, assignment_id, with_driver=True)
     if not assignment:
         raise HTTPException(status_code=404, detail="Assignment not found")
     
     if action.action == "accept":
-        assignment.status = models.AssignmentStatus.ACCEPTED
-        assignment.response_time = datetime.now()
+        if not crud.transition_assignment(
+            db, assignment, models.AssignmentStatus.PENDING,
+            status=models.AssignmentStatus.ACCEPTED,
+            response_time=datetime.now()
+        ):
+            raise HTTPException(status_code=409, detail="Assignment was already responded to")
         
         # Update route as assigned
         assignment.route.is_assigned = True
@@ -225,23 +315,37 @@ def respond_to_assignment(assignment_id: int, action: schemas.AssignmentAction,
         )
         
         db.commit()
+        driver = assignment.driver
+        fleet_state.update_driver(driver.location_id, driver.id, db, credits=driver.credits, bonus_credits=driver.bonus_credits)
+        fleet_state.update_route(assignment.route.location_id, assignment.route_id, db, is_assigned=True)
+        dashboard_service.invalidate(driver.location_id)
+        event_hub.event_hub.publish(assignment.driver_id, "assignment", {
+            "assignment_id": assignment.id, "route_id": assignment.route_id, "status": "ACCEPTED"
+        })
         return {"message": "Assignment accepted", "credits_earned": credits}
     
     elif action.action == "decline":
-        assignment.status = models.AssignmentStatus.DECLINED
-        assignment.response_time = datetime.now()
-        assignment.decline_reason = action.decline_reason
+        if not crud.transition_assignment(
+            db, assignment, models.AssignmentStatus.PENDING,
+            status=models.AssignmentStatus.DECLINED,
+            response_time=datetime.now(),
+            decline_reason=action.decline_reason
+        ):
+            raise HTTPException(status_code=409, detail="Assignment was already responded to")
         
-        # Find available drivers for reassignment
-        available_drivers = logic.find_available_drivers(
-            db, 
-            assignment.driver.location_id,
+        # Find the available driver nearest the route start for reassignment
+        # (fleet state checked against the database first, so a driver another process took off duty is not picked)
+        from . import intelligent_dispatch
+        route = assignment.route
+        nearest = intelligent_dispatch.find_nearest_drivers(
+            fleet_state.get(assignment.driver.location_id, validate_db=db),
+            route.start_lat, route.start_lng,
             exclude_driver_id=assignment.driver_id
         )
         
-        if available_drivers:
-            # Reassign to first available driver with bonus
-            new_driver = available_drivers[0]
+        if nearest:
+            # Reassign with bonus
+            new_driver, _ = nearest[0]
             bonus = 5  # Bonus credits for taking declined route
             
             new_assignment = models.Assignment(
@@ -263,8 +367,9 @@ def respond_to_assignment(assignment_id: int, action: schemas.AssignmentAction,
                 "route_assigned"
             )
             
-            # Send email
-            email_service.send_route_assignment_email(
+            # Queue email, sent after commit
+            email_service.enqueue_route_assignment_email(
+                db,
                 new_driver.email,
                 new_driver.name,
                 assignment.route.description,
@@ -273,6 +378,16 @@ def respond_to_assignment(assignment_id: int, action: schemas.AssignmentAction,
             )
         
         db.commit()
+        email_service.outbox_sender.notify()
+        dashboard_service.invalidate(assignment.driver.location_id)
+        
+        event_hub.event_hub.publish(assignment.driver_id, "assignment", {
+            "assignment_id": assignment.id, "route_id": assignment.route_id, "status": "DECLINED"
+        })
+        if nearest:
+            event_hub.event_hub.publish(new_driver.id, "assignment", {
+                "assignment_id": new_assignment.id, "route_id": new_assignment.route_id, "status": "PENDING"
+            })
         return {"message": "Assignment declined and reassigned"}
     
     else:
@@ -280,13 +395,49 @@ def respond_to_assignment(assignment_id: int, action: schemas.AssignmentAction,
 
 # ============ NOTIFICATION ENDPOINTS ============
 
+@app.get("/events/{user_id}")
+async def driver_events(
+    user_id: int,
+    last_event_id: Optional[str] = None,
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID")
+):
+    """
+    Server-Sent Events stream of a driver's new notifications and assignment changes
+    Reconnects resume after Last-Event-ID (header, or ?last_event_id=); a "resync"
+    event means events were missed and the lists should be refetched
+    """
+    return StreamingResponse(
+        event_hub.stream_events(user_id, last_event_id_header or last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/notifications/{user_id}", response_model=List[schemas.NotificationResponse])
-def get_notifications(user_id: int, unread_only: bool = False, db: Session = Depends(get_db)):
-    """Get user notifications"""
-    query = db.query(models.Notification).filter(models.Notification.user_id == user_id)
+async def get_notifications(request: Request, response: Response, user_id: int, unread_only: bool = False, cursor: str = None, limit: int = None, db: AsyncSession = Depends(get_async_read_db)):
+    """Get user notifications newest first (next page: X-Next-Cursor; 304 on If-None-Match)"""
+    filters = [models.Notification.user_id == user_id]
     if unread_only:
-        query = query.filter(models.Notification.is_read == False)
-    return query.order_by(models.Notification.created_at.desc()).all()
+        filters.append(models.Notification.is_read == False)
+    
+    versions = (await db.execute(sync_service.versions_select(models.Notification, filters))).one()
+    cached = sync_service.not_modified(request, response, versions)
+    if cached:
+        return cached
+    return await pagination.paginate_async(
+        db, select(models.Notification).filter(*filters), [models.Notification.created_at, models.Notification.id],
+        response, cursor, limit, descending=True
+    )
+
+@app.get("/sync/{user_id}", response_model=schemas.SyncResponse)
+async def sync_driver(user_id: int, since: str = None, db: AsyncSession = Depends(get_async_read_db)):
+    """
+    Delta sync for the driver app: the profile, assignments and notifications changed
+    after ?since= (everything on the first call); pass the returned cursor next time
+    """
+    user = await db.get(models.User, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return await sync_service.sync_driver(db, user, since)
 
 @app.patch("/notifications/{notification_id}/read")
 def mark_notification_read(notification_id: int, db: Session = Depends(get_db)):
@@ -301,50 +452,11 @@ def mark_notification_read(notification_id: int, db: Session = Depends(get_db)):
 
 @app.get("/admin/dashboard/{location_id}", response_model=schemas.DashboardStats)
 def get_admin_dashboard(location_id: str, db: Session = Depends(get_db)):
-    """Get comprehensive admin dashboard stats"""
-    drivers = db.query(models.User).filter(models.User.location_id == location_id).all()
-    
-    total_drivers = len(drivers)
-    active_drivers = len([d for d in drivers if d.is_available])
-    avg_fatigue = sum([d.fatigue_score for d in drivers]) / total_drivers if total_drivers > 0 else 0
-    
-    today = datetime.now().date()
-    today_assignments = db.query(models.Assignment).filter(
-        models.Assignment.assigned_date >= datetime.combine(today, datetime.min.time())
-    ).all()
-    
-    total_routes_today = len(today_assignments)
-    pending = len([a for a in today_assignments if a.status == models.AssignmentStatus.PENDING])
-    completed = len([a for a in today_assignments if a.status == models.AssignmentStatus.COMPLETED])
-    
-    # Drivers needing attention
-    attention_drivers = []
-    for driver in drivers:
-        if driver.fatigue_score > 70 or driver.health_status != models.HealthStatus.NORMAL:
-            weekly_balance = logic.get_weekly_balance(driver, db)
-            driver_assignments = [a for a in today_assignments if a.driver_id == driver.id]
-            
-            attention_drivers.append(schemas.DriverStats(
-                driver_id=driver.id,
-                driver_name=driver.name,
-                fatigue=driver.fatigue_score,
-                credits=driver.credits,
-                bonus_credits=driver.bonus_credits,
-                health_status=driver.health_status.value,
-                weekly_balance={k.name: v for k, v in weekly_balance.items()},
-                total_assignments=len([a for a in driver_assignments]),
-                pending_assignments=len([a for a in driver_assignments if a.status == models.AssignmentStatus.PENDING])
-            ))
-    
-    return schemas.DashboardStats(
-        total_drivers=total_drivers,
-        active_drivers=active_drivers,
-        total_routes_today=total_routes_today,
-        pending_assignments=pending,
-        completed_today=completed,
-        avg_fatigue=avg_fatigue,
-        drivers_needing_attention=attention_drivers
-    )
+    """
+    Get comprehensive admin dashboard stats (cached for a few seconds per location)
+    Rebuilt from the primary: a rebuild right after invalidate() must see the write behind it
+    """
+    return dashboard_service.get_dashboard(db, location_id)
 
 @app.post("/admin/policy/update")
 def update_weekly_policy(policy: schemas.WeeklyPolicyUpdate, db: Session = Depends(get_db)):
@@ -365,10 +477,14 @@ def update_weekly_policy(policy: schemas.WeeklyPolicyUpdate, db: Session = Depen
         db.add(new_policy)
     
     db.commit()
+    fleet_state.set_policy(existing_policy or new_policy, db)
+    
+    # Auto-dispatch time or toggle may have changed
+    scheduler.dispatch_scheduler.request_reload()
     return {"message": "Policy updated successfully"}
 
 @app.get("/admin/policy/{location_id}")
-def get_weekly_policy(location_id: str, db: Session = Depends(get_db)):
+def get_weekly_policy(location_id: str, db: Session = Depends(get_read_db)):
     """Get current weekly policy for location"""
     policy = db.query(models.WeeklyPolicy).filter(
         models.WeeklyPolicy.location_id == location_id
@@ -391,159 +507,185 @@ def get_weekly_policy(location_id: str, db: Session = Depends(get_db)):
     return policy
 
 @app.get("/admin/reports/{location_id}")
-def get_daily_reports(location_id: str, db: Session = Depends(get_db)):
+def get_daily_reports(location_id: str, db: Session = Depends(get_read_db)):
     """Get history of daily formatted reports"""
     reports = db.query(models.DailyReport).filter(
         models.DailyReport.location_id == location_id
     ).order_by(models.DailyReport.report_date.desc()).all()
     return reports
 
-# ============ DISPATCH ENGINE ============
+# Bytes read per chunk when streaming report files
+REPORT_STREAM_CHUNK_SIZE = 64 * 1024
 
-def perform_dispatch(location_id: str, db: Session):
-    """Refactored core dispatch logic for reuse"""
-    # Get available drivers for this location
-    drivers = db.query(models.User).filter(
-        models.User.location_id == location_id,
-        models.User.is_available == True
-    ).all()
-    
-    if not drivers:
-        return {"message": "No available drivers", "assignments_count": 0}
-    
-    # Get unassigned routes for this location
-    available_routes = db.query(models.Route).filter(
-        models.Route.location_id == location_id,
-        models.Route.is_assigned == False
-    ).all()
-    
-    if not available_routes:
-        return {
-            "message": "No unassigned routes found.",
-            "assignments_count": 0
-        }
+def _parse_byte_range(range_header: Optional[str], file_size: int):
+    """
+    (start, end) inclusive from a single "bytes=" Range header, None for the whole file
+    Raises 416 when the range lies outside the file
+    """
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None
     
-    # Get policy
-    policy = db.query(models.WeeklyPolicy).filter(
-        models.WeeklyPolicy.location_id == location_id
-    ).first()
-    
-    if not policy:
-        policy = models.WeeklyPolicy(location_id=location_id)
-        db.add(policy)
-        db.commit()
+    first, _, last = range_header[len("bytes="):].strip().partition("-")
+    try:
+        if first == "":
+            # Suffix range: the last N bytes
+            start, end = max(0, file_size - int(last)), file_size - 1
+        else:
+            start = int(first)
+            end = min(int(last), file_size - 1) if last else file_size - 1
+    except ValueError:
+        return None
+    
+    if start > end or start >= file_size:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{file_size}"}
+        )
+    return start, end
+
+def _iter_file(path: str, start: int, length: int):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(REPORT_STREAM_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+@app.get("/admin/reports/{report_id}/download")
+def download_daily_report(
+    report_id: int,
+    range_header: Optional[str] = Header(None, alias="Range"),
+    db: Session = Depends(get_read_db)
+):
+    """Stream a rendered report PDF; supports single byte ranges for resumable downloads"""
+    report = db.query(models.DailyReport).filter(models.DailyReport.id == report_id).first()
+    if not report:
+        raise HTTPException(status_code=404, detail="Report not found")
+    
+    if report.status in ("QUEUED", "RENDERING"):
+        raise HTTPException(status_code=409, detail=f"Report is {report.status.lower()}, try again shortly")
+    if not report.pdf_path or not os.path.exists(report.pdf_path):
+        raise HTTPException(status_code=404, detail="Report file not available")
+    
+    file_size = os.path.getsize(report.pdf_path)
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f'attachment; filename="{os.path.basename(report.pdf_path)}"'
+    }
     
-    assignments_made = []
+    byte_range = _parse_byte_range(range_header, file_size)
+    if byte_range is None:
+        headers["Content-Length"] = str(file_size)
+        return StreamingResponse(
+            _iter_file(report.pdf_path, 0, file_size),
+            media_type="application/pdf",
+            headers=headers
+        )
     
-    # Use Intelligent AI-Powered Assignment System
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        _iter_file(report.pdf_path, start, end - start + 1),
+        status_code=status.HTTP_206_PARTIAL_CONTENT,
+        media_type="application/pdf",
+        headers=headers
+    )
+
+# ============ DISPATCH ENGINE ============
+
+@app.post("/dispatch/run")
+def run_daily_dispatch(location_id: str, solver: str = None, wait: bool = True, db: Session = Depends(get_db)):
+    """
+    Run the AI-powered fair dispatch algorithm manually (solver: greedy or optimal)
+    Runs inline by default; wait=false queues a job and returns its id, poll /dispatch/jobs/{job_id}
+    """
     from . import intelligent_dispatch
     
-    intelligent_assignments = intelligent_dispatch.intelligent_route_assignment(
-        drivers=drivers,
-        routes=available_routes,
-        db=db,
-        policy=policy
-    )
+    if solver and solver not in intelligent_dispatch.SOLVERS:
+        raise HTTPException(status_code=400, detail=f"Invalid solver, expected one of {', '.join(intelligent_dispatch.SOLVERS)}")
     
-    for driver, route, explanation, reason_code in intelligent_assignments:
-        assignment = models.Assignment(
-            driver_id=driver.id,
-            route_id=route.id,
-            explanation=explanation,
-            assignment_reason=reason_code,
-            status=models.AssignmentStatus.PENDING
-        )
-        db.add(assignment)
-        assignments_made.append(assignment)
-        route.is_assigned = True
-        
-        # Update fatigue
-        if route.grade == models.RouteGrade.HARD:
-            driver.fatigue_score = min(100, driver.fatigue_score + 15)
-        elif route.grade == models.RouteGrade.MEDIUM:
-            driver.fatigue_score = min(100, driver.fatigue_score + 8)
-        else:
-            driver.fatigue_score = max(0, driver.fatigue_score - 5)
-        
-        # Update health
-        if driver.fatigue_score >= 80:
-            driver.health_status = models.HealthStatus.RESTRICTED
-        elif driver.fatigue_score >= 60:
-            driver.health_status = models.HealthStatus.CAUTION
-        else:
-            driver.health_status = models.HealthStatus.NORMAL
-        
-        # Create notification
-        logic.create_notification(
-            db, driver.id,
-            f"New {route.grade.name} Route Assigned",
-            explanation,
-            "route_assigned"
-        )
-        
-        # Email
+    if wait:
         try:
-            email_service.send_route_assignment_email(
-                driver.email, driver.name, route.description, route.grade.name, explanation
-            )
-        except: pass
-        
-    db.commit()
+            return dispatch_service.perform_dispatch(location_id, db, solver=solver)
+        except dispatch_service.DispatchInProgress as e:
+            raise HTTPException(status_code=409, detail=str(e))
     
-    # Generate Report
-    try:
-        pdf_path = pdf_service.generate_daily_report(
-            assignments=assignments_made,
-            location_id=location_id,
-            date_str=datetime.now().strftime("%Y-%m-%d")
-        )
-        report = models.DailyReport(
-            report_date=datetime.now(),
-            location_id=location_id,
-            pdf_path=pdf_path,
-            assignments_count=len(assignments_made)
-        )
-        db.add(report)
-        db.commit()
-    except Exception as e:
-        print(f"Error report: {e}")
+    job = dispatch_jobs.submit(location_id, solver=solver)
+    return {
+        "message": "Dispatch queued",
+        "job_id": job.id,
+        "status": job.status
+    }
 
-    return {"message": "Success", "assignments_count": len(assignments_made)}
+@app.get("/dispatch/jobs")
+def list_dispatch_jobs(location_id: str = None):
+    """Recent dispatch jobs, newest first"""
+    return [job.to_dict() for job in dispatch_jobs.list_jobs(location_id)]
 
-@app.post("/dispatch/run")
-def run_daily_dispatch(location_id: str, db: Session = Depends(get_db)):
-    """Run the AI-powered fair dispatch algorithm manually"""
-    return perform_dispatch(location_id, db)
-
-async def auto_dispatch_scheduler():
-    """Background task to run auto-dispatches based on time rule"""
-    while True:
-        try:
-            db = database.SessionLocal()
-            now = datetime.now()
-            current_time = now.strftime("%H:%M")
-            
-            # Find policies with auto-dispatch enabled
-            policies = db.query(models.WeeklyPolicy).filter(
-                models.WeeklyPolicy.auto_dispatch_enabled == True,
-                models.WeeklyPolicy.auto_dispatch_time == current_time
-            ).all()
-            
-            for policy in policies:
-                print(f"[{datetime.now()}] Triggering Auto-Dispatch for {policy.location_id}")
-                perform_dispatch(policy.location_id, db)
-                
-            db.close()
-        except Exception as e:
-            print(f"Scheduler Error: {e}")
-            
-        # Wait 60 seconds before next check
-        await asyncio.sleep(60)
+@app.get("/dispatch/jobs/{job_id}")
+def get_dispatch_job(job_id: str):
+    """Progress, result and timing breakdown of a dispatch job"""
+    job = dispatch_jobs.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Dispatch job not found")
+    return job.to_dict()
 
 @app.on_event("startup")
 async def startup_event():
+    # Blocking connect (and possible MySQL timeout) kept off the event loop
+    await asyncio.get_running_loop().run_in_executor(None, init_database)
+    
+    # Reports whose worker stopped before rendering them
+    resubmitted = await asyncio.get_running_loop().run_in_executor(None, pdf_service.resubmit_pending_reports)
+    if resubmitted:
+        print(f"Resubmitted {resubmitted} pending report(s) for rendering")
+    
     print("Starting Auto-Dispatch Scheduler...")
-    asyncio.create_task(auto_dispatch_scheduler())
+    asyncio.create_task(scheduler.auto_dispatch_scheduler())
+    email_service.outbox_sender.start()
+    replica_router.replica_router.start()
+
+@app.on_event("shutdown")
+def shutdown_event():
+    # Let a standby worker take over scheduling right away
+    scheduler.scheduler_lease.release()
+    email_service.outbox_sender.stop()
+    replica_router.replica_router.stop()
+
+@app.get("/admin/db/pool")
+def get_pool_metrics():
+    """Connection pool usage: checkout latency, saturation and connection churn per pool"""
+    return database.pool_metrics()
+
+@app.get("/admin/db/replicas")
+def get_replica_status():
+    """Replica lag as last measured and which replicas currently serve reads"""
+    return replica_router.replica_router.status()
+
+@app.get("/admin/scoring/cache")
+def get_score_cache_stats():
+    """Compatibility score cache: matrix hits/misses per location and cells reused vs rescored"""
+    return score_cache.stats()
+
+@app.get("/admin/fleet")
+def get_fleet_state():
+    """Cached fleet state per location: version, size and age"""
+    return fleet_state.status()
+
+@app.post("/admin/fleet/resync")
+def resync_fleet_state(location_id: str = None):
+    """Drop the cached fleet state of a location (or all); it is reloaded on next use"""
+    fleet_state.resync(location_id)
+    return {"message": "Fleet state will be reloaded", "location_id": location_id}
+
+@app.get("/admin/scheduler/runs")
+def get_scheduler_runs():
+    """Start/finish times of the most recent auto-dispatch runs per location"""
+    return scheduler.recent_runs()
 
 # ============ DEMO DATA ENDPOINT ============
 
@@ -650,6 +792,7 @@ def populate_demo_data(location_id: str = "LOC001", db: Session = Depends(get_db
         db.add(policy)
     
     db.commit()
+    fleet_state.resync(location_id)
     return {"message": "Demo data populated successfully", "location_id": location_id}
 
 @app.get("/")
@@ -1,11 +1,15 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Enum, Boolean, Text
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, Date, DateTime, Enum, Boolean, Text, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.dialects import mysql
 import enum
 from datetime import datetime
 
 Base = declarative_base()
 
+# Microsecond precision on MySQL so two changes within one second still differ (sync cursors, ETags)
+PreciseDateTime = DateTime().with_variant(mysql.DATETIME(fsp=6), "mysql")
+
 class HealthStatus(enum.Enum):
     NORMAL = "NORMAL"
     CAUTION = "CAUTION"
@@ -21,6 +25,12 @@ class UserRole(enum.Enum):
     DISPATCHER = "DISPATCHER"
     ADMIN = "ADMIN"
 
+class EmailStatus(enum.Enum):
+    PENDING = "PENDING"
+    SENDING = "SENDING"
+    SENT = "SENT"
+    FAILED = "FAILED"
+
 class AssignmentStatus(enum.Enum):
     PENDING = "PENDING"
     ACCEPTED = "ACCEPTED"
@@ -40,6 +50,9 @@ class Admin(Base):
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        Index("ix_users_location_available", "location_id", "is_available"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     employee_id = Column(String(50), unique=True, index=True)
@@ -69,12 +82,18 @@ class User(Base):
     license_type = Column(String(50), nullable=True)
     photo_url = Column(Text, nullable=True)
     
+    # Stamped on every insert/update; drives delta sync and list ETags
+    updated_at = Column(PreciseDateTime, default=datetime.now, onupdate=datetime.now)
+    
     assignments = relationship("Assignment", back_populates="driver", foreign_keys="Assignment.driver_id")
     credit_logs = relationship("CreditLog", back_populates="driver")
     notifications = relationship("Notification", back_populates="user")
 
 class Route(Base):
     __tablename__ = "routes"
+    __table_args__ = (
+        Index("ix_routes_location_assigned", "location_id", "is_assigned"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     description = Column(String(255))
@@ -110,11 +129,18 @@ class Route(Base):
     # Route Status
     is_assigned = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(PreciseDateTime, default=datetime.now, onupdate=datetime.now)
     
     assignments = relationship("Assignment", back_populates="route")
 
 class Assignment(Base):
     __tablename__ = "assignments"
+    __table_args__ = (
+        Index("ix_assignments_driver_date_status", "driver_id", "assigned_date", "status"),
+        Index("ix_assignments_date", "assigned_date", "id"),  # Dashboard day window, newest-first paging
+        Index("ix_assignments_driver_updated", "driver_id", "updated_at"),  # Delta sync
+        Index("ix_assignments_report", "report_id", "id"),  # Report rendering
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     driver_id = Column(Integer, ForeignKey("users.id"))
@@ -138,6 +164,13 @@ class Assignment(Base):
     completed_at = Column(DateTime, nullable=True)
     actual_time_minutes = Column(Integer, nullable=True)
     
+    # Dispatch run that wrote this assignment (None for incremental placements and reassignments)
+    report_id = Column(Integer, ForeignKey("daily_reports.id"), nullable=True)
+    
+    # Optimistic concurrency: bumped on every status transition
+    version = Column(Integer, default=0, nullable=False)
+    updated_at = Column(PreciseDateTime, default=datetime.now, onupdate=datetime.now)
+    
     driver = relationship("User", back_populates="assignments", foreign_keys=[driver_id])
     original_driver = relationship("User", foreign_keys=[original_driver_id])
     route = relationship("Route", back_populates="assignments")
@@ -156,6 +189,10 @@ class CreditLog(Base):
 
 class Notification(Base):
     __tablename__ = "notifications"
+    __table_args__ = (
+        Index("ix_notifications_user_read_created", "user_id", "is_read", "created_at"),
+        Index("ix_notifications_user_updated", "user_id", "updated_at"),  # Delta sync
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -164,11 +201,16 @@ class Notification(Base):
     is_read = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.now)
     notification_type = Column(String(50))  # route_assigned, route_declined, bonus, etc.
+    updated_at = Column(PreciseDateTime, default=datetime.now, onupdate=datetime.now)
     
     user = relationship("User", back_populates="notifications")
 
 class WeeklyPolicy(Base):
     __tablename__ = "weekly_policies"
+    __table_args__ = (
+        Index("ix_weekly_policies_location", "location_id"),
+        Index("ix_weekly_policies_auto_dispatch", "auto_dispatch_enabled", "auto_dispatch_time"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     location_id = Column(String(50))
@@ -189,6 +231,7 @@ class WeeklyPolicy(Base):
     # Auto-dispatch scheduling
     auto_dispatch_enabled = Column(Boolean, default=False)
     auto_dispatch_time = Column(String(10), default="08:00") # Format: "HH:MM"
+    last_auto_dispatch_date = Column(Date) # Day of the last window the scheduler claimed
     
     updated_at = Column(DateTime, default=datetime.now)
     updated_by = Column(String(100))
@@ -202,3 +245,37 @@ class DailyReport(Base):
     pdf_path = Column(Text)
     assignments_count = Column(Integer)
     created_at = Column(DateTime, default=datetime.now)
+    
+    # Background rendering: QUEUED -> RENDERING -> READY / FAILED
+    status = Column(String(20), default="READY")
+    window_start = Column(DateTime, nullable=True)  # Dispatch run whose assignments (Assignment.report_id) are reported
+    window_end = Column(DateTime, nullable=True)
+    render_ms = Column(Integer, nullable=True)
+    file_size = Column(Integer, nullable=True)
+
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    to_email = Column(String(100))
+    subject = Column(String(255))
+    body = Column(Text)
+    html_body = Column(Text, nullable=True)
+    
+    # Delivery tracking
+    status = Column(Enum(EmailStatus), default=EmailStatus.PENDING)
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.now)
+    claimed_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.now)
+    sent_at = Column(DateTime, nullable=True)
+
+class SchedulerLease(Base):
+    __tablename__ = "scheduler_leases"
+    
+    # One row per singleton job, e.g. "auto_dispatch" or "dispatch:LOC001"
+    name = Column(String(100), primary_key=True)
+    holder = Column(String(100))  # host:pid:token of the current leader
+    expires_at = Column(DateTime)
+    acquired_at = Column(DateTime)
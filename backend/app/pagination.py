@@ -0,0 +1,105 @@
+"""
+Keyset Pagination
+List endpoints page on a (sort key, id) tuple instead of OFFSET, so every page
+costs one index range scan no matter how deep the client has scrolled
+The position is handed out as an opaque cursor in the X-Next-Cursor header
+"""
+from fastapi import HTTPException, Response
+from sqlalchemy import DateTime, and_, or_, false
+from datetime import datetime
+from typing import List, Optional
+import base64
+import json
+import os
+
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "500"))
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(values: List) -> str:
+    plain = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(plain).encode()).decode().rstrip("=")
+
+def decode_cursor(token: str, keys: List) -> List:
+    """Key values of a cursor, 400 if it was not produced for these keys"""
+    try:
+        plain = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        if not isinstance(plain, list) or len(plain) != len(keys):
+            raise ValueError("wrong number of keys")
+        return [
+            datetime.fromisoformat(v) if isinstance(key.type, DateTime) and v is not None else v
+            for key, v in zip(keys, plain)
+        ]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _equal(key, value):
+    return key.is_(None) if value is None else key == value
+
+def _past(key, value, descending: bool):
+    """
+    key strictly past value in key order; NULL sorts first ascending and last
+    descending, as on MySQL and SQLite, so rows with a NULL key are not skipped
+    """
+    if value is None:
+        return false() if descending else key.isnot(None)
+    if not descending:
+        return key > value
+    if key.expression.nullable:
+        return or_(key < value, key.is_(None))
+    return key < value
+
+def _after(keys: List, values: List, descending: bool):
+    """Rows strictly past the cursor in (keys) order, expanded for index-friendly range scans"""
+    clauses = []
+    for i, key in enumerate(keys):
+        clauses.append(and_(*[_equal(keys[j], values[j]) for j in range(i)], _past(key, values[i], descending)))
+    return or_(*clauses)
+
+def _page_statement(query, keys: List, cursor: Optional[str], limit: Optional[int], descending: bool):
+    """Apply cursor, order and limit to a Query or select(); returns it with the clamped page size"""
+    limit = max(1, min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
+    
+    if cursor:
+        query = query.filter(_after(keys, decode_cursor(cursor, keys), descending))
+    order = [key.desc() for key in keys] if descending else list(keys)
+    
+    # One extra row tells whether there is a next page
+    return query.order_by(*order).limit(limit + 1), limit
+
+def _finish_page(rows: List, keys: List, response: Response, limit: int) -> List:
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor([getattr(last, key.key) for key in keys])
+    return rows
+
+def paginate(
+    query,
+    keys: List,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    descending: bool = False
+) -> List:
+    """
+    One page of query ordered by keys (the last key must be unique, e.g. the id)
+    Sets X-Next-Cursor on the response when more rows follow
+    """
+    query, limit = _page_statement(query, keys, cursor, limit, descending)
+    return _finish_page(query.all(), keys, response, limit)
+
+async def paginate_async(
+    db,
+    statement,
+    keys: List,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    descending: bool = False
+) -> List:
+    """paginate() for a select() run on an AsyncSession"""
+    statement, limit = _page_statement(statement, keys, cursor, limit, descending)
+    rows = (await db.execute(statement)).scalars().all()
+    return _finish_page(list(rows), keys, response, limit)
@@ -1,26 +1,59 @@
-from fpdf import FPDF
 import os
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from typing import Iterator
 
-class PDFReport(FPDF):
-    def header(self):
-        self.set_font('Arial', 'B', 15)
-        self.cell(0, 10, 'FairDispatch - Daily Assignment Report', 0, 1, 'C')
-        self.ln(5)
+from sqlalchemy import select
 
-    def footer(self):
-        self.set_y(-15)
-        self.set_font('Arial', 'I', 8)
-        self.cell(0, 10, 'Page ' + str(self.page_no()), 0, 0, 'C')
+from . import models, database
 
-def generate_daily_report(assignments, location_id, date_str, output_dir="reports"):
+# One table row of the report, captured as plain values
+ReportRow = namedtuple("ReportRow", ["driver_name", "employee_id", "area", "grade", "explanation"])
+
+# Assignment rows fetched from the database per round trip while rendering
+REPORT_PAGE_ROWS = int(os.getenv("REPORT_PAGE_ROWS", "500"))
+
+REPORTS_DIR = os.getenv("REPORTS_DIR", "reports")
+
+# Reports render off the request and dispatch paths on this pool
+report_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("REPORT_WORKERS", "1")),
+    thread_name_prefix="report"
+)
+
+_report_class = None
+
+def report_class():
+    """PDFReport, built on first use so fpdf is only imported by processes that render"""
+    global _report_class
+    if _report_class is None:
+        from fpdf import FPDF
+        
+        class PDFReport(FPDF):
+            def header(self):
+                self.set_font('Arial', 'B', 15)
+                self.cell(0, 10, 'FairDispatch - Daily Assignment Report', 0, 1, 'C')
+                self.ln(5)
+
+            def footer(self):
+                self.set_y(-15)
+                self.set_font('Arial', 'I', 8)
+                self.cell(0, 10, 'Page ' + str(self.page_no()), 0, 0, 'C')
+        
+        _report_class = PDFReport
+    return _report_class
+
+def generate_daily_report(assignments, location_id, date_str, output_dir=REPORTS_DIR):
+    # assignments is any iterable of ReportRow, consumed once (e.g. streamed from the DB)
     # Ensure output directory exists (absolute path relative to app execution or fixed)
     # We will use 'reports' folder in backend root usually
     
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
-    pdf = PDFReport()
+    pdf = report_class()()
     pdf.add_page()
     pdf.set_font('Arial', '', 12)
     
@@ -43,23 +76,13 @@ def generate_daily_report(assignments, location_id, date_str, output_dir="report
     
     # Rows
     pdf.set_font('Arial', '', 7)
-    for assignment in assignments:
-        driver = assignment.driver
-        route = assignment.route
-        
-        driver_name = driver.name[:15] if driver else "Unknown"
-        emp_id = driver.employee_id if driver else "N/A"
-        area = route.area[:20] if route else "N/A"
+    for row in assignments:
+        driver_name = row.driver_name[:15] if row.driver_name else "Unknown"
+        emp_id = row.employee_id or "N/A"
+        area = row.area[:20] if row.area else "N/A"
+        grade_str = row.grade or "N/A"
         
-        # Handle Enum for grade
-        grade_str = "N/A"
-        if route and route.grade:
-            try:
-                grade_str = route.grade.name 
-            except:
-                grade_str = str(route.grade)
-        
-        explanation = assignment.explanation if assignment.explanation else "No reasoning provided."
+        explanation = row.explanation if row.explanation else "No reasoning provided."
         
         # We use multi_cell for the explanation if it's long, but for a table row we might need to handle it carefully
         # Or just use a smaller font and truncate or wrap
@@ -81,7 +104,101 @@ def generate_daily_report(assignments, location_id, date_str, output_dir="report
         # This is a bit complex with FPDF raw. Simplest is to just use a fixed height or multi_cell and draw rects.
         # However, for now, let's just use regular cell and hope it fits or use small font.
         
-    filename = f"Dispatch_{location_id}_{datetime.now().strftime('%Y%m%d%H%M%S')}.pdf"
+    filename = f"Dispatch_{location_id}_{datetime.now().strftime('%Y%m%d%H%M%S%f')}.pdf"
     filepath = os.path.join(output_dir, filename)
-    pdf.output(filepath, 'F')
+    
+    # Readers never see a half-written file: write aside, then rename into place
+    partial_path = filepath + ".part"
+    pdf.output(partial_path, 'F')
+    os.replace(partial_path, filepath)
     return filepath
+
+def iter_report_rows(db, report: models.DailyReport) -> Iterator[ReportRow]:
+    """
+    Rows of the assignments written by the dispatch run behind a report (by
+    Assignment.report_id), fetched REPORT_PAGE_ROWS at a time instead of loading the whole run
+    """
+    query = db.query(
+        models.User.name,
+        models.User.employee_id,
+        models.Route.area,
+        models.Route.grade,
+        models.Assignment.explanation
+    ).join(
+        models.User, models.Assignment.driver_id == models.User.id
+    ).join(
+        models.Route, models.Assignment.route_id == models.Route.id
+    ).filter(
+        models.Assignment.report_id == report.id
+    ).order_by(models.Assignment.id).yield_per(REPORT_PAGE_ROWS)
+    
+    for driver_name, employee_id, area, grade, explanation in query:
+        yield ReportRow(
+            driver_name=driver_name,
+            employee_id=employee_id,
+            area=area,
+            grade=grade.name if grade is not None else None,
+            explanation=explanation
+        )
+
+def render_report(report_id: int):
+    """Render a queued DailyReport to PDF on a worker thread using its own session"""
+    db = database.BatchSessionLocal()
+    try:
+        report = db.get(models.DailyReport, report_id)
+        if report is None:
+            return
+        report.status = "RENDERING"
+        db.commit()
+        
+        started = time.perf_counter()
+        try:
+            pdf_path = generate_daily_report(
+                assignments=iter_report_rows(db, report),
+                location_id=report.location_id,
+                date_str=report.report_date.strftime("%Y-%m-%d")
+            )
+            report.pdf_path = pdf_path
+            report.file_size = os.path.getsize(pdf_path)
+            report.status = "READY"
+        except Exception as e:
+            db.rollback()
+            print(f"Error rendering report {report_id}: {e}")
+            report.status = "FAILED"
+        report.render_ms = int((time.perf_counter() - started) * 1000)
+        db.commit()
+    finally:
+        db.close()
+
+def submit_report(report_id: int):
+    """Queue a committed DailyReport for background rendering"""
+    report_executor.submit(render_report, report_id)
+
+def resubmit_pending_reports() -> int:
+    """
+    Queue reports left QUEUED or RENDERING by a process that stopped, e.g. at startup
+    Reports of a location whose dispatch lock is live belong to a run still writing and are left to it
+    """
+    db = database.SessionLocal()
+    try:
+        running = {
+            name.split(":", 1)[1]
+            for name in db.execute(
+                select(models.SchedulerLease.name).where(
+                    models.SchedulerLease.name.like("dispatch:%"),
+                    models.SchedulerLease.expires_at > datetime.now()
+                )
+            ).scalars()
+        }
+        pending = db.execute(
+            select(models.DailyReport.id, models.DailyReport.location_id)
+            .where(models.DailyReport.status.in_(["QUEUED", "RENDERING"]))
+            .order_by(models.DailyReport.id)
+        ).all()
+    finally:
+        db.close()
+    
+    resubmitted = [report_id for report_id, location_id in pending if location_id not in running]
+    for report_id in resubmitted:
+        submit_report(report_id)
+    return len(resubmitted)
@@ -0,0 +1,104 @@
+"""
+Connection Pool Metrics
+QueuePool subclasses that record checkout latency, timeouts and connection
+churn, so pool pressure from dispatch and driver polling is visible live
+"""
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from collections import deque
+import threading
+import time
+
+# Checkout waits kept for the percentile figures
+LATENCY_SAMPLES = 1000
+
+class PoolMetricsMixin:
+    """Counters shared by the sync and async instrumented pools"""
+    
+    def _metrics_state(self):
+        state = self.__dict__.get("_metrics")
+        if state is None:
+            state = self.__dict__.setdefault("_metrics", {
+                "lock": threading.Lock(),
+                "started": time.monotonic(),
+                "checkouts": 0,
+                "timeouts": 0,
+                "created": 0,
+                "closed": 0,
+                "wait_total": 0.0,
+                "wait_max": 0.0,
+                "waits": deque(maxlen=LATENCY_SAMPLES),
+            })
+        return state
+    
+    def _do_get(self):
+        state = self._metrics_state()
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            with state["lock"]:
+                state["timeouts"] += 1
+            raise
+        waited = time.perf_counter() - started
+        
+        with state["lock"]:
+            state["checkouts"] += 1
+            state["wait_total"] += waited
+            state["wait_max"] = max(state["wait_max"], waited)
+            state["waits"].append(waited)
+        return connection
+    
+    def _create_connection(self):
+        state = self._metrics_state()
+        with state["lock"]:
+            state["created"] += 1
+        return super()._create_connection()
+    
+    def _close_connection(self, connection, *args, **kwargs):
+        state = self._metrics_state()
+        with state["lock"]:
+            state["closed"] += 1
+        return super()._close_connection(connection, *args, **kwargs)
+    
+    def metrics(self) -> dict:
+        """Point-in-time pool usage plus cumulative checkout and churn counters"""
+        state = self._metrics_state()
+        with state["lock"]:
+            waits = sorted(state["waits"])
+            checkouts = state["checkouts"]
+            snapshot = {key: state[key] for key in ("timeouts", "created", "closed")}
+            wait_total, wait_max = state["wait_total"], state["wait_max"]
+            uptime = time.monotonic() - state["started"]
+        
+        capacity = self.size() + max(self._max_overflow, 0)
+        checked_out = self.checkedout()
+        
+        def percentile(p):
+            return round(waits[min(len(waits) - 1, int(len(waits) * p))] * 1000, 3) if waits else 0.0
+        
+        return {
+            "pool_size": self.size(),
+            "max_overflow": self._max_overflow,
+            "timeout_seconds": self._timeout,
+            "recycle_seconds": self._recycle,
+            "checked_out": checked_out,
+            "checked_in": self.checkedin(),
+            "overflow": self.overflow(),
+            "saturation": round(checked_out / capacity, 3) if capacity > 0 else None,
+            "checkouts": checkouts,
+            "checkout_timeouts": snapshot["timeouts"],
+            "checkout_wait_ms_avg": round(wait_total / checkouts * 1000, 3) if checkouts else 0.0,
+            "checkout_wait_ms_p50": percentile(0.50),
+            "checkout_wait_ms_p95": percentile(0.95),
+            "checkout_wait_ms_max": round(wait_max * 1000, 3),
+            "connections_created": snapshot["created"],
+            "connections_closed": snapshot["closed"],
+            "uptime_seconds": round(uptime, 1),
+        }
+
+class InstrumentedQueuePool(PoolMetricsMixin, QueuePool):
+    pass
+
+class InstrumentedAsyncQueuePool(PoolMetricsMixin, AsyncAdaptedQueuePool):
+    pass
@@ -0,0 +1,42 @@
+"""
+SQL Statement Counter
+Counts the statements an engine executes inside a block, used by
+check_query_counts.py to pin the query count of hot read endpoints
+"""
+from sqlalchemy import event
+from typing import List
+
+from . import database
+
+class QueryCounter:
+    """
+    Context manager that records every statement run on the engine while active
+    (by default both the sync engine and the async engine behind the async endpoints)
+    Counts all threads (request handlers run on a thread pool), so keep
+    background workers idle while measuring
+    """
+    
+    def __init__(self, engine=None):
+        self.engines = [engine] if engine is not None else [database.engine, database.async_engine.sync_engine]
+        self.statements: List[str] = []
+    
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+    
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+    
+    def __enter__(self):
+        self.statements = []
+        for engine in self.engines:
+            event.listen(engine, "before_cursor_execute", self._before_execute)
+        return self
+    
+    def __exit__(self, *exc):
+        for engine in self.engines:
+            event.remove(engine, "before_cursor_execute", self._before_execute)
+        return False
+
+def count_queries(engine=None) -> QueryCounter:
+    return QueryCounter(engine)
@@ -0,0 +1,151 @@
+"""
+Read Replica Router
+Picks the engine for read-only endpoints: a healthy replica (round robin)
+whose replication lag is within REPLICA_MAX_LAG_SECONDS, otherwise the primary
+A client that just wrote is pinned to the primary for that same window,
+so it always reads its own writes: browsers keep the pin as a cookie, other
+clients (e.g. the Flutter app's http client) echo the pin header back
+"""
+from sqlalchemy import text
+from typing import Dict, Optional
+import itertools
+import threading
+import time
+import os
+
+from . import database
+
+# Stale-read tolerance: replicas lagging more than this are skipped,
+# and clients read from the primary for this long after a write
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+
+# How often replica lag is re-measured
+REPLICA_HEALTH_CHECK_SECONDS = float(os.getenv("REPLICA_HEALTH_CHECK_SECONDS", "5"))
+
+# Set on write responses; carries the time until which reads go to the primary
+PRIMARY_COOKIE = "fd_read_primary_until"
+
+# Same pin as a header for clients without a cookie store: sent on write
+# responses, echoed on the following reads until it expires
+PRIMARY_UNTIL_HEADER = "X-Read-Primary-Until"
+
+# Clients without cookies can ask for the primary explicitly ("primary")
+CONSISTENCY_HEADER = "X-Read-Consistency"
+
+WRITE_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+
+def replica_lag(engine) -> float:
+    """
+    Replication delay of a replica in seconds
+    A server that is not replicating (e.g. a second local SQLite file or MySQL
+    instance used for testing), or whose status the user may not read, counts
+    as current; stopped replication as infinite
+    """
+    if engine.dialect.name != "mysql":
+        return 0.0
+    
+    with engine.connect() as conn:
+        for statement, column in (("SHOW REPLICA STATUS", "Seconds_Behind_Source"),
+                                  ("SHOW SLAVE STATUS", "Seconds_Behind_Master")):
+            try:
+                row = conn.execute(text(statement)).mappings().first()
+            except Exception:
+                continue  # Older servers only know the SLAVE spelling
+            if row is None:
+                return 0.0
+            lag = row.get(column)
+            return float(lag) if lag is not None else float("inf")
+    return 0.0
+
+class ReplicaRouter:
+    """Tracks replica lag in the background and hands out read engines"""
+    
+    def __init__(self):
+        self._lags: Dict[int, Optional[float]] = {}
+        self._turn = itertools.count()
+        self._thread = None
+        self._stop = threading.Event()
+    
+    def refresh(self):
+        """Measure every replica's lag; an unreachable replica is marked None"""
+        lags = {}
+        for index, (engine, _) in enumerate(database.get_replica_engines()):
+            try:
+                lags[index] = replica_lag(engine)
+            except Exception as e:
+                print(f"Replica {index} unavailable: {e}")
+                lags[index] = None
+        self._lags = lags
+    
+    def healthy(self):
+        return [index for index, lag in sorted(self._lags.items())
+                if lag is not None and lag <= REPLICA_MAX_LAG_SECONDS]
+    
+    def _pick(self, prefer_primary: bool) -> Optional[int]:
+        if prefer_primary:
+            return None
+        healthy = self.healthy()
+        if not healthy:
+            return None
+        return healthy[next(self._turn) % len(healthy)]
+    
+    def sync_engine(self, prefer_primary: bool = False):
+        index = self._pick(prefer_primary)
+        return database.get_engine() if index is None else database.get_replica_engines()[index][0]
+    
+    def async_engine(self, prefer_primary: bool = False):
+        index = self._pick(prefer_primary)
+        return database.get_async_engine() if index is None else database.get_replica_engines()[index][1]
+    
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Replica health check error: {e}")
+            self._stop.wait(REPLICA_HEALTH_CHECK_SECONDS)
+    
+    def start(self):
+        """Start lag checks; until the first one finishes all reads use the primary"""
+        if not database.DATABASE_REPLICA_URLS or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="replica-health", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+        self._thread = None
+    
+    def status(self) -> dict:
+        return {
+            "replicas": len(database.DATABASE_REPLICA_URLS),
+            "max_lag_seconds": REPLICA_MAX_LAG_SECONDS,
+            "lag_seconds": {str(index): lag for index, lag in sorted(self._lags.items())},
+            "healthy": self.healthy()
+        }
+
+replica_router = ReplicaRouter()
+
+def wants_primary(request) -> bool:
+    """True if this client wrote recently or asked for read-your-writes consistency"""
+    if request.headers.get(CONSISTENCY_HEADER, "").lower() == "primary":
+        return True
+    for pinned_until in (request.cookies.get(PRIMARY_COOKIE), request.headers.get(PRIMARY_UNTIL_HEADER)):
+        try:
+            if pinned_until and float(pinned_until) > time.time():
+                return True
+        except ValueError:
+            continue
+    return False
+
+def mark_write(response):
+    """Pin the client to the primary until replicas have caught up with its write"""
+    pinned_until = f"{time.time() + REPLICA_MAX_LAG_SECONDS:.3f}"
+    response.set_cookie(
+        PRIMARY_COOKIE,
+        pinned_until,
+        max_age=int(REPLICA_MAX_LAG_SECONDS) + 1,
+        httponly=True
+    )
+    response.headers[PRIMARY_UNTIL_HEADER] = pinned_until
@@ -0,0 +1,280 @@
+"""
+Auto-Dispatch Scheduler
+Keeps a heap of next fire times per location and runs due dispatches
+concurrently on a worker pool, each worker with its own DB session,
+so the event loop stays responsive
+Only the process holding the "auto_dispatch" lease runs the scheduler,
+and each window is claimed in the database before it fires, so neither
+multi-worker deployments nor a restart or failover dispatch a location twice
+"""
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from datetime import datetime, date, time, timedelta
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import heapq
+import os
+
+from sqlalchemy import func, update, or_
+from sqlalchemy.orm import Session
+
+from . import models, database, dispatch_service, leader_election
+
+# Maximum number of locations dispatched at the same time
+AUTO_DISPATCH_MAX_WORKERS = int(os.getenv("AUTO_DISPATCH_MAX_WORKERS", "4"))
+
+# A window missed by less than this (e.g. during a restart) still fires late
+AUTO_DISPATCH_CATCHUP_MINUTES = int(os.getenv("AUTO_DISPATCH_CATCHUP_MINUTES", "60"))
+
+dispatch_executor = ThreadPoolExecutor(
+    max_workers=AUTO_DISPATCH_MAX_WORKERS,
+    thread_name_prefix="auto-dispatch"
+)
+
+# Most recent runs, newest last
+_recent_runs = deque(maxlen=200)
+
+def recent_runs() -> List[dict]:
+    return list(_recent_runs)
+
+def claim_window(db: Session, location_id: str, fire_date: date) -> bool:
+    """
+    Record that the location's window of fire_date is being dispatched
+    Conditional UPDATE, so of several schedulers (or one restarted) exactly one wins
+    """
+    policy = models.WeeklyPolicy
+    result = db.execute(
+        update(policy)
+        .where(
+            policy.location_id == location_id,
+            or_(policy.last_auto_dispatch_date == None, policy.last_auto_dispatch_date < fire_date)
+        )
+        .values(last_auto_dispatch_date=fire_date)
+    )
+    db.commit()
+    return result.rowcount > 0
+
+def dispatch_location(location_id: str, fire_date: Optional[date] = None) -> dict:
+    """
+    Dispatch one location on a worker thread using its own session
+    With fire_date, skips unless that day's window can still be claimed
+    """
+    started_at = datetime.now()
+    print(f"[{started_at}] Auto-Dispatch started for {location_id}")
+
+    db = database.BatchSessionLocal()
+    try:
+        if fire_date is not None and not claim_window(db, location_id, fire_date):
+            result = {"message": f"Auto-Dispatch window of {fire_date} already ran", "assignments_count": 0}
+            status = "skipped"
+        else:
+            result = dispatch_service.perform_dispatch(location_id, db)
+            status = "completed"
+    except dispatch_service.DispatchInProgress as e:
+        result = {"message": str(e), "assignments_count": 0}
+        status = "skipped"
+    except Exception as e:
+        db.rollback()
+        result = {"message": str(e), "assignments_count": 0}
+        status = "failed"
+    finally:
+        db.close()
+
+    finished_at = datetime.now()
+    duration = (finished_at - started_at).total_seconds()
+    print(f"[{finished_at}] Auto-Dispatch {status} for {location_id} in {duration:.2f}s")
+
+    run = {
+        "location_id": location_id,
+        "status": status,
+        "started_at": started_at,
+        "finished_at": finished_at,
+        "duration_seconds": duration,
+        "result": result
+    }
+    _recent_runs.append(run)
+    return run
+
+def parse_dispatch_time(value: str) -> Optional[time]:
+    """Parse a policy's "HH:MM" auto_dispatch_time, None if malformed"""
+    try:
+        return datetime.strptime(value.strip(), "%H:%M").time()
+    except (AttributeError, ValueError):
+        return None
+
+def policy_signature() -> Tuple:
+    """Cheap fingerprint of the policies table, changes on any policy insert or update"""
+    db = database.SessionLocal()
+    try:
+        return tuple(db.query(
+            func.count(models.WeeklyPolicy.id), func.max(models.WeeklyPolicy.updated_at)
+        ).one())
+    finally:
+        db.close()
+
+def load_dispatch_times() -> Dict[str, Tuple[time, Optional[date]]]:
+    """Auto-dispatch time and last fired window of every location with auto-dispatch enabled"""
+    db = database.SessionLocal()
+    try:
+        policies = db.query(models.WeeklyPolicy).filter(
+            models.WeeklyPolicy.auto_dispatch_enabled == True
+        ).all()
+    finally:
+        db.close()
+
+    times = {}
+    for policy in policies:
+        fire_time = parse_dispatch_time(policy.auto_dispatch_time)
+        if fire_time is None:
+            print(f"Scheduler: ignoring invalid auto_dispatch_time '{policy.auto_dispatch_time}' for {policy.location_id}")
+            continue
+        times[policy.location_id] = (fire_time, policy.last_auto_dispatch_date)
+    return times
+
+class DispatchScheduler:
+    """
+    Min-heap of (next fire time, location) built from the enabled policies
+    Sleeps exactly until the earliest entry is due, reloads only when a policy
+    changes (request_reload), and runs dispatches on the executor
+    Windows missed by less than AUTO_DISPATCH_CATCHUP_MINUTES are fired late instead of skipped
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[datetime, str]] = []
+        self._times: Dict[str, time] = {}
+        self._last_fired: Dict[str, date] = {}
+        self._running = set()
+        self._tasks = set()
+        self._loop = None
+        self._reload_event = None
+
+    def request_reload(self):
+        """Rebuild the heap from the database; safe to call from any thread"""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._reload_event.set)
+
+    def next_fire_time(self, location_id: str, fire_time: time, now: datetime) -> datetime:
+        """Today's slot unless it already ran or is past the catch-up window, else tomorrow's"""
+        candidate = datetime.combine(now.date(), fire_time)
+        already_fired = self._last_fired.get(location_id) == now.date()
+        too_late = now - candidate > timedelta(minutes=AUTO_DISPATCH_CATCHUP_MINUTES)
+        if already_fired or too_late:
+            candidate += timedelta(days=1)
+        return candidate
+
+    async def reload(self):
+        loop = asyncio.get_running_loop()
+        self._times = {}
+        for location_id, (fire_time, last_fired) in (await loop.run_in_executor(dispatch_executor, load_dispatch_times)).items():
+            self._times[location_id] = fire_time
+            # Windows fired before a restart or by a previous leader
+            if last_fired is not None and last_fired > self._last_fired.get(location_id, date.min):
+                self._last_fired[location_id] = last_fired
+
+        now = datetime.now()
+        self._heap = [
+            (self.next_fire_time(location_id, fire_time, now), location_id)
+            for location_id, fire_time in self._times.items()
+        ]
+        heapq.heapify(self._heap)
+        print(f"Scheduler: {len(self._heap)} location(s) scheduled")
+
+    async def _wait_for_reload(self, timeout: Optional[float]) -> bool:
+        """Sleep up to timeout seconds; True if a reload was requested meanwhile"""
+        try:
+            await asyncio.wait_for(self._reload_event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _fire(self, location_id: str, fire_date: date):
+        self._running.add(location_id)
+        try:
+            await asyncio.get_running_loop().run_in_executor(dispatch_executor, dispatch_location, location_id, fire_date)
+        finally:
+            self._running.discard(location_id)
+
+    def _fired(self, task: asyncio.Task):
+        """Done callback of _fire tasks: drop the reference and report failures"""
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Scheduler Error: Auto-Dispatch task failed: {task.exception()!r}")
+
+    async def run(self):
+        self._loop = asyncio.get_running_loop()
+        self._reload_event = asyncio.Event()
+        self._reload_event.set()
+
+        while True:
+            try:
+                if self._reload_event.is_set():
+                    self._reload_event.clear()
+                    await self.reload()
+
+                if not self._heap:
+                    await self._wait_for_reload(None)
+                    continue
+
+                delay = (self._heap[0][0] - datetime.now()).total_seconds()
+                if delay > 0 and await self._wait_for_reload(delay):
+                    continue
+
+                # Fire everything that is due, including windows missed while busy
+                now = datetime.now()
+                while self._heap and self._heap[0][0] <= now:
+                    fire_at, location_id = heapq.heappop(self._heap)
+                    self._last_fired[location_id] = fire_at.date()
+                    heapq.heappush(self._heap, (fire_at + timedelta(days=1), location_id))
+
+                    if not scheduler_lease.is_leader:
+                        print(f"[{now}] Scheduler lease not held, skipping {location_id}")
+                        continue
+
+                    if location_id in self._running:
+                        print(f"[{now}] Auto-Dispatch for {location_id} still running, skipping {fire_at:%H:%M}")
+                        continue
+
+                    late = (now - fire_at).total_seconds()
+                    print(f"[{now}] Triggering Auto-Dispatch for {location_id} (due {fire_at:%H:%M}, {late:.0f}s late)")
+                    task = asyncio.create_task(self._fire(location_id, fire_at.date()))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._fired)
+            except Exception as e:
+                print(f"Scheduler Error: {e}")
+                await asyncio.sleep(60)
+
+dispatch_scheduler = DispatchScheduler()
+scheduler_lease = leader_election.LeaderLease("auto_dispatch")
+
+async def auto_dispatch_scheduler():
+    """
+    Background task to run auto-dispatches based on time rule
+    Keeps competing for the scheduler lease; runs DispatchScheduler only while leader
+    """
+    loop = asyncio.get_running_loop()
+    scheduler_task = None
+    signature = None
+
+    while True:
+        try:
+            # Default executor: lease renewal must not queue behind running dispatches
+            is_leader = await loop.run_in_executor(None, scheduler_lease.try_acquire)
+
+            if is_leader and scheduler_task is None:
+                print(f"Scheduler: {scheduler_lease.holder} is now the auto-dispatch leader")
+                signature = await loop.run_in_executor(None, policy_signature)
+                scheduler_task = asyncio.create_task(dispatch_scheduler.run())
+            elif not is_leader and scheduler_task is not None:
+                print(f"Scheduler: {scheduler_lease.holder} lost the auto-dispatch lease")
+                scheduler_task.cancel()
+                scheduler_task = None
+            elif is_leader:
+                # Policy updates served by other workers only reach the leader through the DB
+                current = await loop.run_in_executor(None, policy_signature)
+                if current != signature:
+                    signature = current
+                    dispatch_scheduler.request_reload()
+        except Exception as e:
+            print(f"Scheduler Error: {e}")
+
+        await asyncio.sleep(scheduler_lease.renew_interval)
@@ -120,6 +120,15 @@ class NotificationResponse(BaseModel):
     class Config:
         from_attributes = True
 
+# ============ SYNC SCHEMAS ============
+
+class SyncResponse(BaseModel):
+    cursor: str  # Pass as ?since= on the next sync
+    full: bool  # True for a complete snapshot (first sync, no cursor)
+    profile: Optional[UserResponse] = None  # Only when the profile changed
+    assignments: List[AssignmentResponse]
+    notifications: List[NotificationResponse]
+
 # ============ ADMIN SCHEMAS ============
 
 class WeeklyPolicyUpdate(BaseModel):
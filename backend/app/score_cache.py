@@ -0,0 +1,119 @@
+"""
+Compatibility Score Cache
+Memoizes driver x route compatibility across dispatches and what-if runs
+Keys are built from the scoring inputs themselves (driver fatigue, health and
+weekly balance; route grade, stairs, parking, traffic and start point; the
+time-of-day bucket), so a change to any of them is a miss, never a stale hit
+matrix_cache keeps the last compatibility matrix per location, LRU over
+locations; a re-dispatch copies the pairs whose driver and route are unchanged
+from it and only scores the rest (see scoring_engine.build_compatibility_matrix)
+"""
+from collections import OrderedDict
+from typing import Dict, Hashable
+import threading
+import os
+
+from .models import RouteGrade
+
+# Locations whose last matrix is kept (each is drivers x routes scores and distances)
+SCORE_CACHE_LOCATIONS = int(os.getenv("SCORE_CACHE_LOCATIONS", "16"))
+
+def hour_bucket(hour: int) -> int:
+    """Time of day as the scoring rules see it: 1 morning rush, 2 evening rush, 0 otherwise"""
+    if 6 <= hour <= 10:
+        return 1
+    if 17 <= hour <= 20:
+        return 2
+    return 0
+
+def driver_key(driver, weekly_balance: Dict[RouteGrade, int]) -> tuple:
+    """Everything about a driver the score depends on (the position derives from the id)"""
+    return (
+        driver.id, driver.fatigue_score, driver.health_status,
+        weekly_balance[RouteGrade.EASY], weekly_balance[RouteGrade.MEDIUM], weekly_balance[RouteGrade.HARD]
+    )
+
+def route_key(route) -> tuple:
+    """Everything about a route the score depends on"""
+    return (
+        route.id, route.grade, route.has_elevator, route.stairs_count,
+        route.parking_difficulty, route.traffic_level, route.start_lat, route.start_lng
+    )
+
+class LRUCache:
+    """Thread-safe bounded mapping that evicts the least recently used entry"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None
+        }
+
+class MatrixCache(LRUCache):
+    """
+    Last CompatibilityMatrix per location
+    hits/misses count locations; pairs_reused/pairs_scored count matrix cells
+    """
+
+    def __init__(self, max_locations: int):
+        super().__init__(max_locations)
+        self.pairs_reused = 0
+        self.pairs_scored = 0
+
+    def record(self, reused: int, scored: int):
+        with self._lock:
+            self.pairs_reused += reused
+            self.pairs_scored += scored
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        pairs = self.pairs_reused + self.pairs_scored
+        stats.update({
+            "pairs_reused": self.pairs_reused,
+            "pairs_scored": self.pairs_scored,
+            "pair_reuse_rate": round(self.pairs_reused / pairs, 4) if pairs else None
+        })
+        return stats
+
+matrix_cache = MatrixCache(SCORE_CACHE_LOCATIONS)
+
+def stats() -> dict:
+    return {"matrices": matrix_cache.stats()}
+
+def clear():
+    """Forget all cached scores"""
+    matrix_cache.clear()
@@ -0,0 +1,262 @@
+"""
+Vectorized Driver x Route Compatibility Scoring
+Builds the full compatibility matrix in one NumPy pass instead of
+calling calculate_driver_route_compatibility once per pair
+"""
+from .models import User, Route, RouteGrade, HealthStatus
+from .intelligent_dispatch import get_driver_current_location, score_driver_route, calculate_distance
+from .balance_service import balance_for
+from .spatial_index import EARTH_RADIUS_KM, PROXIMITY_RADII_KM
+from .score_cache import hour_bucket, driver_key, route_key, matrix_cache
+from datetime import datetime
+from typing import List, Dict, Optional, Tuple
+import numpy as np
+
+# Health codes used as row index into HEALTH_GRADE_POINTS
+HEALTH_NORMAL = 0
+HEALTH_CAUTION = 1
+HEALTH_RESTRICTED = 2
+
+# Points per (health code, grade index) - grade index is RouteGrade.value - 1
+HEALTH_GRADE_POINTS = np.array([
+    [10, 10, 10],     # NORMAL
+    [10, 0, -15],     # CAUTION
+    [20, -10, -30],   # RESTRICTED
+])
+
+# Points per (fatigue band, grade index): <30, <60, >=60
+FATIGUE_GRADE_POINTS = np.array([
+    [5, 5, 15],
+    [0, 10, -5],
+    [15, -10, -25],
+])
+
+# Points per (experience band, grade index): <5 routes, 5-15 routes, >15 routes
+EXPERIENCE_GRADE_POINTS = np.array([
+    [10, 0, -15],
+    [0, 0, 0],
+    [0, 0, 10],
+])
+
+def haversine_matrix(lat1, lng1, lat2, lng2):
+    """Pairwise Haversine distances (km) between two sets of coordinates"""
+    lat1_rad = np.radians(lat1)[:, None]
+    lat2_rad = np.radians(lat2)[None, :]
+    delta_lat = lat2_rad - lat1_rad
+    delta_lon = np.radians(lng2)[None, :] - np.radians(lng1)[:, None]
+
+    a = np.sin(delta_lat / 2) ** 2 + np.cos(lat1_rad) * np.cos(lat2_rad) * np.sin(delta_lon / 2) ** 2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+    return EARTH_RADIUS_KM * c
+
+def proximity_distances(d: "DriverFeatures", routes: List[Route]) -> np.ndarray:
+    """
+    Driver x route distances (km) in one dense pass; every pair is scored anyway
+    Pairs outside the widest proximity band earn no proximity points and are set to NaN
+    """
+    distances = haversine_matrix(
+        d.lat, d.lng,
+        np.array([r.start_lat for r in routes], dtype=float),
+        np.array([r.start_lng for r in routes], dtype=float)
+    )
+    distances[distances >= PROXIMITY_RADII_KM[-1]] = np.nan
+    return distances
+
+def _health_code(status) -> int:
+    if status == HealthStatus.RESTRICTED:
+        return HEALTH_RESTRICTED
+    if status == HealthStatus.CAUTION:
+        return HEALTH_CAUTION
+    return HEALTH_NORMAL
+
+class DriverFeatures:
+    """Column arrays of the driver attributes used by the scoring rules"""
+
+    def __init__(self, drivers: List[User], weekly_balances: Dict[int, Dict]):
+        locations = [get_driver_current_location(d) for d in drivers]
+        self.lat = np.array([loc[0] for loc in locations], dtype=float)
+        self.lng = np.array([loc[1] for loc in locations], dtype=float)
+        self.fatigue = np.array([d.fatigue_score for d in drivers], dtype=float)
+        self.health = np.array([_health_code(d.health_status) for d in drivers], dtype=int)
+
+        # Weekly counts, columns ordered EASY, MEDIUM, HARD
+        self.weekly = np.array([
+            [balance_for(weekly_balances, d.id)[grade] for grade in (RouteGrade.EASY, RouteGrade.MEDIUM, RouteGrade.HARD)]
+            for d in drivers
+        ], dtype=int).reshape(len(drivers), 3)
+        self.total_routes = self.weekly.sum(axis=1)
+
+class RouteFeatures:
+    """Column arrays of the route attributes used by the scoring rules"""
+
+    def __init__(self, routes: List[Route]):
+        self.grade_index = np.array([r.grade.value - 1 for r in routes], dtype=int)
+        self.stairs_heavy = np.array([(not r.has_elevator) and r.stairs_count > 50 for r in routes], dtype=bool)
+        self.hard_parking = np.array([r.parking_difficulty > 0.7 for r in routes], dtype=bool)
+        self.low_traffic = np.array([r.traffic_level < 0.5 for r in routes], dtype=bool)
+
+class CompatibilityMatrix:
+    """
+    Scores and distances for every (driver, route) pair
+    scores[i, j] equals calculate_driver_route_compatibility(drivers[i], routes[j])["score"]
+    distances[i, j] is NaN for pairs outside the proximity bands
+    driver_keys / route_keys identify the scoring inputs of each row / column (see score_cache)
+    """
+
+    def __init__(self, drivers: List[User], routes: List[Route], weekly_balances: Dict[int, Dict],
+                 scores: np.ndarray, distances: np.ndarray, current_hour: int,
+                 driver_keys: List[tuple] = None, route_keys: List[tuple] = None):
+        self.drivers = drivers
+        self.routes = routes
+        self.weekly_balances = weekly_balances
+        self.scores = scores
+        self.distances = distances
+        self.current_hour = current_hour
+        self.hour_bucket = hour_bucket(current_hour)
+        self.driver_keys = driver_keys
+        self.route_keys = route_keys
+
+    def compatibility(self, driver_index: int, route_index: int) -> Dict:
+        """Full compatibility dict (score, distance, bonuses, penalties) for one pair"""
+        driver = self.drivers[driver_index]
+        route = self.routes[route_index]
+        return score_driver_route(
+            driver,
+            route,
+            balance_for(self.weekly_balances, driver.id),
+            self.distance(driver_index, route_index),
+            self.current_hour
+        )
+
+    def distance(self, driver_index: int, route_index: int) -> float:
+        """Driver to route start distance (km), computed on demand for far-away pairs"""
+        distance = self.distances[driver_index, route_index]
+        if np.isnan(distance):
+            driver_lat, driver_lng = get_driver_current_location(self.drivers[driver_index])
+            route = self.routes[route_index]
+            distance = calculate_distance(driver_lat, driver_lng, route.start_lat, route.start_lng)
+        return float(distance)
+
+def build_compatibility_matrix(
+    drivers: List[User],
+    routes: List[Route],
+    weekly_balances: Dict[int, Dict],
+    current_hour: Optional[int] = None,
+    previous: Optional[CompatibilityMatrix] = None
+) -> CompatibilityMatrix:
+    """
+    Score every driver against every route in one vectorized pass
+    Follows score_driver_route rule for rule, so scores match the scalar path
+    With previous (an earlier matrix, e.g. the last dispatch of the location), pairs whose
+    driver and route inputs are unchanged are copied from it and only the rest are scored
+    """
+    if current_hour is None:
+        current_hour = datetime.now().hour
+
+    driver_keys = [driver_key(d, balance_for(weekly_balances, d.id)) for d in drivers]
+    route_keys = [route_key(r) for r in routes]
+
+    if previous is None or previous.driver_keys is None or previous.hour_bucket != hour_bucket(current_hour):
+        scores, distances = score_pairs(drivers, routes, weekly_balances, current_hour)
+        matrix_cache.record(0, scores.size)
+    else:
+        scores, distances = _rescore_changed(previous, drivers, routes, driver_keys, route_keys, weekly_balances, current_hour)
+
+    return CompatibilityMatrix(drivers, routes, weekly_balances, scores, distances, current_hour, driver_keys, route_keys)
+
+def _rescore_changed(
+    previous: CompatibilityMatrix,
+    drivers: List[User],
+    routes: List[Route],
+    driver_keys: List[tuple],
+    route_keys: List[tuple],
+    weekly_balances: Dict[int, Dict],
+    current_hour: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Scores for drivers x routes reusing previous: unchanged rows x unchanged columns are
+    copied, new or changed drivers are scored against every route and unchanged drivers
+    against new or changed routes
+    """
+    previous_rows = {key: i for i, key in enumerate(previous.driver_keys)}
+    previous_cols = {key: j for j, key in enumerate(previous.route_keys)}
+    old_rows = np.array([previous_rows.get(key, -1) for key in driver_keys], dtype=int)
+    old_cols = np.array([previous_cols.get(key, -1) for key in route_keys], dtype=int)
+    kept_rows, new_rows = np.flatnonzero(old_rows >= 0), np.flatnonzero(old_rows < 0)
+    kept_cols, new_cols = np.flatnonzero(old_cols >= 0), np.flatnonzero(old_cols < 0)
+
+    scores = np.empty((len(drivers), len(routes)), dtype=previous.scores.dtype)
+    distances = np.empty((len(drivers), len(routes)), dtype=float)
+
+    if kept_rows.size and kept_cols.size:
+        source = np.ix_(old_rows[kept_rows], old_cols[kept_cols])
+        scores[np.ix_(kept_rows, kept_cols)] = previous.scores[source]
+        distances[np.ix_(kept_rows, kept_cols)] = previous.distances[source]
+
+    if new_rows.size:
+        block_scores, block_distances = score_pairs([drivers[i] for i in new_rows], routes, weekly_balances, current_hour)
+        scores[new_rows, :] = block_scores
+        distances[new_rows, :] = block_distances
+
+    if kept_rows.size and new_cols.size:
+        block_scores, block_distances = score_pairs(
+            [drivers[i] for i in kept_rows], [routes[j] for j in new_cols], weekly_balances, current_hour
+        )
+        scores[np.ix_(kept_rows, new_cols)] = block_scores
+        distances[np.ix_(kept_rows, new_cols)] = block_distances
+
+    scored = new_rows.size * len(routes) + kept_rows.size * new_cols.size
+    matrix_cache.record(scores.size - scored, scored)
+    return scores, distances
+
+def score_pairs(
+    drivers: List[User],
+    routes: List[Route],
+    weekly_balances: Dict[int, Dict],
+    current_hour: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """The vectorized scoring rules: (scores, proximity distances) of every driver x route pair"""
+    d = DriverFeatures(drivers, weekly_balances)
+    r = RouteFeatures(routes)
+    g = r.grade_index[None, :]
+
+    score = np.full((len(drivers), len(routes)), 50, dtype=int)
+
+    # 1. Geolocation proximity - dense Haversine distances, NaN (no points) beyond the widest band
+    distances = proximity_distances(d, routes)
+    near, close, moderate = PROXIMITY_RADII_KM
+    score += np.select([distances < near, distances < close, distances < moderate], [30, 20, 10], default=0)
+
+    # 2. Health status
+    score += HEALTH_GRADE_POINTS[d.health[:, None], g]
+
+    # 3. Fatigue level
+    fatigue_band = np.select([d.fatigue < 30, d.fatigue < 60], [0, 1], default=2)
+    score += FATIGUE_GRADE_POINTS[fatigue_band[:, None], g]
+
+    # 4. Weekly balance - points each driver gets for a route of each grade
+    weekly_points = np.stack([
+        np.where(d.weekly[:, 0] < 2, 10, 0),
+        np.where(d.weekly[:, 1] < 3, 10, 0),
+        np.select([d.weekly[:, 2] < 2, d.weekly[:, 2] >= 3], [15, -10], default=0),
+    ], axis=1)
+    score += np.take_along_axis(weekly_points, np.broadcast_to(g, score.shape), axis=1)
+
+    # 5. Experience & skill
+    experience_band = np.select([d.total_routes > 15, d.total_routes < 5], [2, 0], default=1)
+    score += EXPERIENCE_GRADE_POINTS[experience_band[:, None], g]
+
+    # 6. Route characteristics
+    stairs_points = np.where(d.fatigue < 40, 5, -10)
+    score += np.outer(stairs_points, r.stairs_heavy)
+    parking_points = np.where(d.total_routes > 10, 5, -5)
+    score += np.outer(parking_points, r.hard_parking)
+
+    # 7. Time of day
+    if 6 <= current_hour <= 10 or 17 <= current_hour <= 20:
+        score += np.where(r.low_traffic, 5, 0)[None, :]
+
+    np.clip(score, 0, 100, out=score)
+
+    return score, distances
@@ -0,0 +1,130 @@
+"""
+Spatial Index for Proximity Queries
+Uniform lat/lng grid built on radians: answers "points within R km" and
+"k nearest points" by only visiting the grid cells that can contain a match
+"""
+import math
+import numpy as np
+from typing import Dict, Iterable, List, Tuple
+
+EARTH_RADIUS_KM = 6371
+
+# Proximity bands used by the compatibility score (km)
+PROXIMITY_RADII_KM = (2, 5, 10)
+
+def _wrap_degrees(lng):
+    """Longitude(s) in degrees brought into [-180, 180)"""
+    return (lng + 180.0) % 360.0 - 180.0
+
+class SpatialIndex:
+    """
+    Grid index over (lat, lng) points keyed by an arbitrary id
+    Cells are cell_km tall; their width in longitude is widened by 1/cos(lat)
+    at query time and wraps across the antimeridian, so no match is ever
+    missed, and candidates are then filtered with exact Haversine distances
+    """
+
+    def __init__(self, ids: Iterable, lats: Iterable[float], lngs: Iterable[float], cell_km: float = 5.0):
+        self.ids = list(ids)
+        self.lat = np.radians(np.asarray(list(lats), dtype=float))
+        self.lng = np.radians(_wrap_degrees(np.asarray(list(lngs), dtype=float)))
+        self.cell = cell_km / EARTH_RADIUS_KM
+
+        rows = np.floor(self.lat / self.cell).astype(int)
+        cols = np.floor(self.lng / self.cell).astype(int)
+
+        buckets: Dict[Tuple[int, int], List[int]] = {}
+        for idx, key in enumerate(zip(rows.tolist(), cols.tolist())):
+            buckets.setdefault(key, []).append(idx)
+        self.buckets = {key: np.array(members, dtype=int) for key, members in buckets.items()}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _candidates(self, lat_rad: float, lng_rad: float, radius_km: float) -> np.ndarray:
+        """Indices of points in every cell that may hold a point within radius_km"""
+        angular = radius_km / EARTH_RADIUS_KM
+        max_lat = min(abs(lat_rad) + angular, math.pi / 2 - 1e-9)
+        lng_span = 2 * math.asin(min(1.0, math.sin(angular / 2) / math.cos(max_lat)))
+
+        row_lo = math.floor((lat_rad - angular) / self.cell)
+        row_hi = math.floor((lat_rad + angular) / self.cell)
+
+        hits = []
+        for col_lo, col_hi in self._column_ranges(lng_rad, lng_span):
+            # Wide searches visit fewer buckets by walking the bucket dict instead
+            if (row_hi - row_lo + 1) * (col_hi - col_lo + 1) > len(self.buckets):
+                hits += [members for (r, c), members in self.buckets.items()
+                         if row_lo <= r <= row_hi and col_lo <= c <= col_hi]
+            else:
+                hits += [self.buckets[(r, c)]
+                         for r in range(row_lo, row_hi + 1)
+                         for c in range(col_lo, col_hi + 1)
+                         if (r, c) in self.buckets]
+
+        return np.unique(np.concatenate(hits)) if hits else np.zeros(0, dtype=int)
+
+    def _column_ranges(self, lng_rad: float, lng_span: float) -> List[Tuple[int, int]]:
+        """Column ranges covering lng_rad +- lng_span, split where they cross the antimeridian"""
+        lo, hi = lng_rad - lng_span, lng_rad + lng_span
+        if hi - lo >= 2 * math.pi:
+            lo, hi = -math.pi, math.pi
+        ranges = [(max(lo, -math.pi), min(hi, math.pi))]
+        if lo < -math.pi:
+            ranges.append((lo + 2 * math.pi, math.pi))
+        if hi > math.pi:
+            ranges.append((-math.pi, hi - 2 * math.pi))
+        return [(math.floor(a / self.cell), math.floor(b / self.cell)) for a, b in ranges]
+
+    def _distances(self, lat_rad: float, lng_rad: float, indices: np.ndarray) -> np.ndarray:
+        """Haversine distances (km) from one point to the indexed points"""
+        delta_lat = self.lat[indices] - lat_rad
+        delta_lon = self.lng[indices] - lng_rad
+        a = np.sin(delta_lat / 2) ** 2 + math.cos(lat_rad) * np.cos(self.lat[indices]) * np.sin(delta_lon / 2) ** 2
+        return EARTH_RADIUS_KM * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+    def within_indices(self, lat: float, lng: float, radius_km: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Positions (into ids) and distances of all points strictly closer than radius_km"""
+        lat_rad, lng_rad = math.radians(lat), math.radians(float(_wrap_degrees(lng)))
+        candidates = self._candidates(lat_rad, lng_rad, radius_km)
+        distances = self._distances(lat_rad, lng_rad, candidates)
+        close = distances < radius_km
+        return candidates[close], distances[close]
+
+    def within(self, lat: float, lng: float, radius_km: float) -> List[Tuple[object, float]]:
+        """(id, distance_km) of points within radius_km, nearest first"""
+        indices, distances = self.within_indices(lat, lng, radius_km)
+        order = np.argsort(distances, kind="stable")
+        return [(self.ids[indices[o]], float(distances[o])) for o in order]
+
+    def nearest(self, lat: float, lng: float, k: int = 1) -> List[Tuple[object, float]]:
+        """
+        (id, distance_km) of the k nearest points, nearest first
+        Searches a growing radius and stops once k points fall inside it
+        """
+        k = min(k, len(self.ids))
+        if k <= 0:
+            return []
+
+        radius = self.cell * EARTH_RADIUS_KM
+        while True:
+            indices, distances = self.within_indices(lat, lng, radius)
+            if len(indices) >= k or radius >= math.pi * EARTH_RADIUS_KM:
+                break
+            radius *= 2
+
+        if len(indices) < k:
+            # Radius covers the whole globe: fall back to every point
+            lat_rad, lng_rad = math.radians(lat), math.radians(lng)
+            indices = np.arange(len(self.ids))
+            distances = self._distances(lat_rad, lng_rad, indices)
+
+        order = np.argsort(distances, kind="stable")[:k]
+        return [(self.ids[indices[o]], float(distances[o])) for o in order]
+
+def build_driver_index(drivers, cell_km: float = 5.0) -> SpatialIndex:
+    """Index of driver current locations, keyed by position in the drivers list"""
+    from .intelligent_dispatch import get_driver_current_location
+
+    locations = [get_driver_current_location(d) for d in drivers]
+    return SpatialIndex(range(len(drivers)), [loc[0] for loc in locations], [loc[1] for loc in locations], cell_km)
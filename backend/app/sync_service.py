@@ -0,0 +1,110 @@
+"""
+Mobile Sync Service
+Delta sync for the driver app: /sync/{user_id}?since=<cursor> returns only the
+profile, assignments and notifications whose updated_at moved past the cursor.
+Also ETag / If-None-Match for list endpoints, validated with one aggregate query
+(row count, max id, max updated_at) so an unchanged poll never loads a row
+"""
+from fastapi import Request, Response
+from sqlalchemy import select, func, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta
+from typing import List, Optional
+import hashlib
+import os
+
+from . import models, schemas, crud, pagination, database, replica_router
+
+# The next cursor is set this far before the sync started, so rows stamped just
+# before it but committed after it are sent again rather than missed (clients upsert by id)
+SYNC_CURSOR_OVERLAP_SECONDS = float(os.getenv("SYNC_CURSOR_OVERLAP_SECONDS", "2"))
+
+SYNC_CURSOR_KEYS = [models.User.updated_at]
+
+# ============ CONDITIONAL GET ============
+
+def versions_select(model, filters: List, *embedded):
+    """
+    One aggregate row that changes whenever a row matching filters is added, removed
+    or updated; embedded relationships (e.g. Assignment.route) count their updated_at too
+    """
+    columns = [func.count(model.id), func.max(model.id), func.max(model.updated_at)]
+    targets = [relationship.property.mapper.class_ for relationship in embedded]
+    statement = select(*columns, *[func.max(target.updated_at) for target in targets]).select_from(model)
+    for relationship in embedded:
+        statement = statement.outerjoin(relationship)
+    return statement.where(*filters)
+
+def list_etag(request: Request, versions) -> str:
+    """Weak ETag of a list response: the row versions plus the query (filters, cursor, limit)"""
+    key = repr((request.url.path, sorted(request.query_params.multi_items()), tuple(versions)))
+    return f'W/"{hashlib.sha1(key.encode()).hexdigest()[:20]}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison: W/ prefixes are ignored on both sides
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if (candidate[2:] if candidate.startswith("W/") else candidate) == opaque:
+            return True
+    return False
+
+def not_modified(request: Request, response: Response, versions) -> Optional[Response]:
+    """
+    Set the ETag of a list response; returns a bodiless 304 to send instead when
+    the client's If-None-Match already has it
+    """
+    etag = list_etag(request, versions)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    return None
+
+# ============ DELTA SYNC ============
+
+def cursor_overlap() -> timedelta:
+    """Syncs may read from a replica trailing the primary by up to REPLICA_MAX_LAG_SECONDS"""
+    lag = replica_router.REPLICA_MAX_LAG_SECONDS if database.DATABASE_REPLICA_URLS else 0
+    return timedelta(seconds=SYNC_CURSOR_OVERLAP_SECONDS + lag)
+
+def encode_since(moment: datetime) -> str:
+    return pagination.encode_cursor([moment])
+
+def decode_since(cursor: str) -> datetime:
+    """400 on a cursor not produced by encode_since()"""
+    return pagination.decode_cursor(cursor, SYNC_CURSOR_KEYS)[0]
+
+async def sync_driver(db: AsyncSession, user: models.User, since: Optional[str]) -> schemas.SyncResponse:
+    """
+    Everything about one driver that changed after the since cursor (all of it
+    when since is None), plus the cursor for the next call
+    """
+    started = datetime.now()
+    since_at = decode_since(since) if since else None
+
+    assignments = crud.assignments_select().filter(models.Assignment.driver_id == user.id)
+    notifications = select(models.Notification).filter(models.Notification.user_id == user.id)
+    if since_at is not None:
+        # The embedded route counts as part of the assignment
+        assignments = assignments.filter(or_(
+            models.Assignment.updated_at >= since_at,
+            models.Assignment.route.has(models.Route.updated_at >= since_at)
+        ))
+        notifications = notifications.filter(models.Notification.updated_at >= since_at)
+
+    assignments = assignments.order_by(models.Assignment.updated_at, models.Assignment.id)
+    notifications = notifications.order_by(models.Notification.updated_at, models.Notification.id)
+
+    profile_changed = since_at is None or user.updated_at is None or user.updated_at >= since_at
+    return schemas.SyncResponse(
+        cursor=encode_since(started - cursor_overlap()),
+        full=since_at is None,
+        profile=user if profile_changed else None,
+        assignments=(await db.execute(assignments)).scalars().unique().all(),
+        notifications=(await db.execute(notifications)).scalars().all()
+    )
@@ -0,0 +1,151 @@
+"""
+Fleet State Check
+Drives the write endpoints in-process and fails if a validated fleet state read
+right after one of them rehydrates the location (the write's own fingerprint
+change must not look like another process's write), if incremental placements
+rehydrate or grow in statements as the location fills up, or if a write made
+behind the cache's back is not picked up
+Uses DATABASE_URL if set, otherwise a throwaway SQLite file; the database file
+and the seeding dispatch's report go to a temporary directory removed on exit
+"""
+import os
+import sys
+import shutil
+import tempfile
+from datetime import datetime
+
+WORK_DIR = tempfile.mkdtemp(prefix="fleet_check_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(WORK_DIR, 'fleet_check.db')}")
+os.environ.setdefault("REPORTS_DIR", os.path.join(WORK_DIR, "reports"))
+os.environ.setdefault("INCREMENTAL_DISPATCH", "true")
+
+from fastapi.testclient import TestClient
+from sqlalchemy import update
+from backend.app import main, models, database, pdf_service
+from backend.app.fleet_state import fleet_state
+from backend.app.query_counter import count_queries
+
+LOCATION_ID = "FCHECK"
+
+# Incremental placements measured per path
+PLACEMENT_ROUNDS = 6
+
+NEW_ROUTE = {
+    "description": "Fleet check route", "area": "Check", "location_id": LOCATION_ID,
+    "start_lat": 13.09, "start_lng": 80.28, "end_lat": 13.1, "end_lng": 80.3,
+    "package_count": 10, "weight_kg": 5, "has_elevator": True, "traffic_level": 0.3,
+    "apartment_density": 0.2, "walking_distance_km": 1
+}
+
+def validated_hydrations() -> int:
+    """Hydrations after a fingerprint-checked read of the location"""
+    db = database.SessionLocal()
+    try:
+        fleet_state.get(LOCATION_ID, validate_db=db)
+    finally:
+        db.close()
+    return fleet_state.hydrations
+
+def pending_assignment_id(client) -> int:
+    for driver in client.get(f"/users/?location_id={LOCATION_ID}").json():
+        for assignment in client.get(f"/assignments/?driver_id={driver['id']}&status=PENDING").json():
+            return assignment["id"]
+    raise RuntimeError("Seeding dispatch left no pending assignment")
+
+def check_incremental_placement(client, driver_ids) -> int:
+    """
+    Failures among repeated incremental placements: none may rehydrate, and each
+    request must issue the same number of statements as the others with the same
+    outcome (placed or not), however many routes the location already has
+    """
+    def new_route(round_no):
+        return client.post("/routes/", json=NEW_ROUTE).json()["is_assigned"]
+
+    def driver_back_on_duty(round_no):
+        driver_id = driver_ids[round_no % len(driver_ids)]
+        client.patch(f"/users/{driver_id}/availability?is_available=false")
+        response = client.patch(f"/users/{driver_id}/availability?is_available=true")
+        return response.json()["assigned_route_id"] is not None
+
+    paths = {"dispatch_new_route": new_route, "dispatch_available_driver": driver_back_on_duty}
+
+    failures = 0
+    for name, request in paths.items():
+        before = fleet_state.hydrations
+        counts = {}
+        for round_no in range(PLACEMENT_ROUNDS):
+            with count_queries() as counter:
+                placed = request(round_no)
+            counts.setdefault(placed, []).append(counter.count)
+        hydrations = fleet_state.hydrations - before
+        ok = hydrations == 0 and all(len(set(c)) == 1 for c in counts.values())
+        failures += not ok
+        summary = ", ".join(f"{'placed' if placed else 'not placed'} {c}" for placed, c in counts.items())
+        print(f"{'OK  ' if ok else 'FAIL'} {name}: {hydrations} rehydration(s); statements {summary}")
+    return failures
+
+def check_fleet_state():
+    main.init_database(create_schema=True)
+    client = TestClient(main.app)
+
+    print("Seeding demo data...")
+    client.post(f"/demo/populate?location_id={LOCATION_ID}")
+    client.post(f"/dispatch/run?location_id={LOCATION_ID}&wait=true")
+    pdf_service.report_executor.submit(lambda: None).result()
+    driver_ids = [u["id"] for u in client.get(f"/users/?location_id={LOCATION_ID}").json()]
+    driver_id = driver_ids[0]
+    assignment_id = pending_assignment_id(client)
+
+    # Local write -> request that makes it
+    writes = {
+        "availability off": lambda: client.patch(f"/users/{driver_id}/availability?is_available=false"),
+        "availability on": lambda: client.patch(f"/users/{driver_id}/availability?is_available=true"),
+        "route creation": lambda: client.post("/routes/", json=NEW_ROUTE),
+        "accept": lambda: client.post(
+            f"/assignments/{assignment_id}/respond", json={"assignment_id": assignment_id, "action": "accept"}
+        ),
+        "policy update": lambda: client.post(
+            "/admin/policy/update", json={"location_id": LOCATION_ID, "easy_route_credits": 6}
+        ),
+    }
+
+    failures = 0
+    validated_hydrations()
+    for name, write in writes.items():
+        response = write()
+        if response.status_code != 200:
+            raise RuntimeError(f"{name} returned {response.status_code}: {response.text}")
+        before = fleet_state.hydrations
+        after = validated_hydrations()
+        ok = after == before
+        failures += not ok
+        print(f"{'OK  ' if ok else 'FAIL'} {name}: {after - before} rehydration(s) on the next validated read")
+
+    failures += check_incremental_placement(client, driver_ids)
+
+    # Another process's write must still move the fingerprint
+    db = database.SessionLocal()
+    try:
+        db.execute(
+            update(models.User).where(models.User.id == driver_id)
+            .values(fatigue_score=12.5, updated_at=datetime.now())
+        )
+        db.commit()
+    finally:
+        db.close()
+    before = fleet_state.hydrations
+    after = validated_hydrations()
+    ok = after == before + 1 and fleet_state.get(LOCATION_ID).drivers[driver_id].fatigue_score == 12.5
+    failures += not ok
+    print(f"{'OK  ' if ok else 'FAIL'} external write: {after - before} rehydration(s) on the next validated read")
+
+    if failures:
+        print(f"{failures} fleet state check(s) failed")
+        sys.exit(1)
+    print("Fleet state kept current without rehydrating.")
+
+if __name__ == "__main__":
+    try:
+        check_fleet_state()
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
@@ -0,0 +1,77 @@
+"""
+Query Count Check
+Runs the hot read endpoints in-process against small and larger page sizes
+and fails if any of them issues more SQL statements than its budget,
+or if the count grows with the number of rows returned (an N+1)
+Uses DATABASE_URL if set, otherwise a throwaway SQLite file; the database file
+and the seeding dispatch's report go to a temporary directory removed on exit
+"""
+import os
+import sys
+import shutil
+import tempfile
+
+WORK_DIR = tempfile.mkdtemp(prefix="query_check_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(WORK_DIR, 'query_check.db')}")
+os.environ.setdefault("REPORTS_DIR", os.path.join(WORK_DIR, "reports"))
+
+from fastapi.testclient import TestClient
+from backend.app import main, dashboard_service, pdf_service
+from backend.app.query_counter import count_queries
+
+LOCATION_ID = "QCHECK"
+
+# Endpoint -> maximum statements per request
+# (list endpoints: the ETag validator aggregate + the page)
+BUDGETS = {
+    "/users/?location_id={loc}&limit={limit}": 2,
+    "/routes/?location_id={loc}&limit={limit}": 2,
+    "/assignments/?limit={limit}": 2,
+    "/notifications/{driver_id}?limit={limit}": 2,
+    "/sync/{driver_id}": 3,
+    "/admin/dashboard/{loc}": 3,  # Fleet state fingerprint + 2 GROUP BYs
+}
+
+def measure(client, url):
+    with count_queries() as counter:
+        response = client.get(url)
+    if response.status_code != 200:
+        raise RuntimeError(f"{url} returned {response.status_code}: {response.text}")
+    return counter.count, len(response.json()) if isinstance(response.json(), list) else 1
+
+def check_query_counts():
+    main.init_database(create_schema=True)
+    client = TestClient(main.app)
+    
+    print("Seeding demo data...")
+    client.post(f"/demo/populate?location_id={LOCATION_ID}")
+    client.post(f"/dispatch/run?location_id={LOCATION_ID}&wait=true")
+    
+    # The dispatch queued its report; let the render finish so its statements are not counted
+    pdf_service.report_executor.submit(lambda: None).result()
+    driver_id = client.get(f"/users/?location_id={LOCATION_ID}&limit=1").json()[0]["id"]
+    
+    failures = 0
+    for template, budget in BUDGETS.items():
+        counts = []
+        for limit in (1, 100):
+            dashboard_service.invalidate()
+            url = template.format(loc=LOCATION_ID, limit=limit, driver_id=driver_id)
+            counts.append(measure(client, url))
+        
+        (small, small_rows), (large, large_rows) = counts
+        ok = large <= budget and small == large
+        failures += not ok
+        print(f"{'OK  ' if ok else 'FAIL'} {template}: {small} statements for {small_rows} row(s), "
+              f"{large} for {large_rows} row(s) (budget {budget})")
+    
+    if failures:
+        print(f"{failures} endpoint(s) over budget")
+        sys.exit(1)
+    print("All query counts within budget.")
+
+if __name__ == "__main__":
+    try:
+        check_query_counts()
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
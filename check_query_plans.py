@@ -0,0 +1,66 @@
+"""
+Query Plan Check
+EXPLAINs the hot query shapes and fails if any of them would scan a whole
+table instead of using an index (run update_indexes.py first on older databases)
+MySQL may still pick a full scan on near-empty tables; check against real data
+"""
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import Session
+from backend.app.database import engine
+from backend.app import models
+
+def hot_queries(db: Session):
+    since = datetime.now() - timedelta(days=7)
+    return {
+        "assignments by driver/date/status": db.query(models.Assignment).filter(
+            models.Assignment.driver_id == 1,
+            models.Assignment.assigned_date >= since,
+            models.Assignment.status == models.AssignmentStatus.ACCEPTED
+        ),
+        "unassigned routes of a location": db.query(models.Route).filter(
+            models.Route.location_id == "LOC001",
+            models.Route.is_assigned == False
+        ),
+        "available drivers of a location": db.query(models.User).filter(
+            models.User.location_id == "LOC001",
+            models.User.is_available == True
+        ),
+        "unread notifications of a user": db.query(models.Notification).filter(
+            models.Notification.user_id == 1,
+            models.Notification.is_read == False
+        ).order_by(models.Notification.created_at.desc()),
+        "policy of a location": db.query(models.WeeklyPolicy).filter(
+            models.WeeklyPolicy.location_id == "LOC001"
+        ),
+        "auto-dispatch policies": db.query(models.WeeklyPolicy).filter(
+            models.WeeklyPolicy.auto_dispatch_enabled == True
+        ),
+    }
+
+def full_scans(conn, sql):
+    """Plan lines that read a whole table"""
+    if engine.dialect.name == "mysql":
+        rows = conn.exec_driver_sql("EXPLAIN " + sql).mappings().all()
+        return [f"{row['table']}: type=ALL" for row in rows if row["type"] == "ALL"]
+    
+    rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql).all()
+    return [row[-1] for row in rows if row[-1].startswith("SCAN ") and "INDEX" not in row[-1]]
+
+def check_query_plans():
+    failures = 0
+    with Session(engine) as db, engine.connect() as conn:
+        for name, query in hot_queries(db).items():
+            sql = str(query.statement.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+            scans = full_scans(conn, sql)
+            failures += bool(scans)
+            print(f"{'FAIL' if scans else 'OK  '} {name}" + (f": {'; '.join(scans)}" if scans else ""))
+    
+    if failures:
+        print(f"{failures} hot query(s) fall back to a full table scan")
+        sys.exit(1)
+    print("All hot queries use an index.")
+
+if __name__ == "__main__":
+    check_query_plans()
@@ -0,0 +1,52 @@
+"""
+Startup Time Benchmark
+Measures, in fresh interpreters, how long importing the API takes and how long
+until it is ready to serve (database initialized and schema checked), and
+which heavy libraries the import pulled in
+"""
+import json
+import statistics
+import subprocess
+import sys
+
+RUNS = 5
+
+HEAVY_MODULES = ["fpdf", "numpy", "pandas"]
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+from backend.app import main
+imported = time.perf_counter()
+heavy = [m for m in %r if sys.modules.get(m) is not None]
+main.init_database()
+from sqlalchemy import text
+with main.database.get_engine().connect() as conn:
+    conn.execute(text("SELECT 1"))
+ready = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "ready_ms": (ready - started) * 1000,
+    "heavy": heavy
+}))
+""" % (HEAVY_MODULES,)
+
+def run_once():
+    result = subprocess.run([sys.executable, "-c", PROBE], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def check_startup_time():
+    samples = [run_once() for _ in range(RUNS)]
+    import_ms = statistics.median(s["import_ms"] for s in samples)
+    ready_ms = statistics.median(s["ready_ms"] for s in samples)
+    
+    print(f"Startup over {RUNS} runs (median):")
+    print(f"  import backend.app.main : {import_ms:8.1f} ms")
+    print(f"  import -> ready         : {ready_ms:8.1f} ms")
+    heavy = samples[-1]["heavy"]
+    print(f"  heavy modules on import : {', '.join(heavy) if heavy else 'none'}")
+
+if __name__ == "__main__":
+    check_startup_time()
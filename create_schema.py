@@ -0,0 +1,12 @@
+from backend.app import database, models
+
+def create_schema():
+    # Creates any table declared in models.py that is missing; existing tables are left as they are
+    # (column and index changes go through the update_*.py scripts)
+    engine = database.get_engine()
+    print("Connected to database. Creating missing tables...")
+    models.Base.metadata.create_all(bind=engine)
+    print("Schema creation complete.")
+
+if __name__ == "__main__":
+    create_schema()
@@ -0,0 +1,23 @@
+from sqlalchemy import create_engine, text
+from backend.app.database import DATABASE_URL
+
+def update_auto_dispatch_state():
+    engine = create_engine(DATABASE_URL)
+    with engine.connect() as conn:
+        print("Connected to database. Adding auto-dispatch window tracking to weekly_policies...")
+        
+        # Claimed by the scheduler before each window fires, so a restart or failover cannot fire it twice
+        try:
+            conn.execute(text("ALTER TABLE weekly_policies ADD COLUMN last_auto_dispatch_date DATE NULL"))
+            print("Added column: last_auto_dispatch_date")
+        except Exception as e:
+            if "Duplicate column name" in str(e) or "duplicate column name" in str(e):
+                print("Column last_auto_dispatch_date already exists.")
+            else:
+                print(f"Error adding last_auto_dispatch_date: {e}")
+        
+        conn.commit()
+        print("Auto-dispatch state update complete.")
+
+if __name__ == "__main__":
+    update_auto_dispatch_state()
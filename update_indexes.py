@@ -0,0 +1,53 @@
+from sqlalchemy import create_engine, text
+from backend.app.database import DATABASE_URL
+from backend.app import models
+
+# Tables whose indexes (models.__table_args__ and index=True columns) are ensured
+# Unique indexes are skipped: they belong to the table's schema, and building one here
+# could fail on duplicate rows or duplicate a UNIQUE key created under another name
+TABLES = ["users", "routes", "assignments", "notifications", "weekly_policies"]
+
+def index_exists(conn, dialect, table, index_name):
+    if dialect == "mysql":
+        sql = text("""
+        SELECT COUNT(*) FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = :table AND index_name = :index
+        """)
+        return conn.execute(sql, {"table": table, "index": index_name}).scalar() > 0
+    sql = text("SELECT COUNT(*) FROM sqlite_master WHERE type = 'index' AND name = :index")
+    return conn.execute(sql, {"index": index_name}).scalar() > 0
+
+def update_indexes():
+    engine = create_engine(DATABASE_URL)
+    dialect = engine.dialect.name
+    with engine.connect() as conn:
+        print(f"Connected to database ({dialect}). Creating composite indexes...")
+        
+        for table_name in TABLES:
+            table = models.Base.metadata.tables[table_name]
+            for index in sorted(table.indexes, key=lambda i: i.name):
+                if index.unique:
+                    print(f"Skipping unique index {index.name} (part of the table schema).")
+                    continue
+                columns = ", ".join(col.name for col in index.columns)
+                try:
+                    if index_exists(conn, dialect, table_name, index.name):
+                        print(f"Index {index.name} already exists.")
+                        continue
+                    
+                    if dialect == "mysql":
+                        # Online build: reads and writes continue while the index is created
+                        sql = text(f"ALTER TABLE {table_name} ADD INDEX {index.name} ({columns}), ALGORITHM=INPLACE, LOCK=NONE")
+                    else:
+                        sql = text(f"CREATE INDEX IF NOT EXISTS {index.name} ON {table_name} ({columns})")
+                    conn.execute(sql)
+                    conn.commit()
+                    print(f"Created index: {index.name} ON {table_name} ({columns})")
+                except Exception as e:
+                    conn.rollback()
+                    print(f"Error creating {index.name}: {e}")
+        
+        print("Index update complete.")
+
+if __name__ == "__main__":
+    update_indexes()
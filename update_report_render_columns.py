@@ -0,0 +1,47 @@
+from sqlalchemy import create_engine, text
+from backend.app.database import DATABASE_URL
+from update_indexes import update_indexes
+
+def update_report_render_columns():
+    engine = create_engine(DATABASE_URL)
+    with engine.connect() as conn:
+        print("Connected to database. Adding background rendering columns to daily_reports...")
+        
+        # Reports are queued by the dispatch run and rendered by a background worker
+        columns = [
+            ("status", "VARCHAR(20) DEFAULT 'READY'"),
+            ("window_start", "DATETIME NULL"),
+            ("window_end", "DATETIME NULL"),
+            ("render_ms", "INT NULL"),
+            ("file_size", "INT NULL")
+        ]
+        
+        for col_name, col_def in columns:
+            try:
+                sql = text(f"ALTER TABLE daily_reports ADD COLUMN {col_name} {col_def}")
+                conn.execute(sql)
+                print(f"Added column: {col_name}")
+            except Exception as e:
+                if "Duplicate column name" in str(e) or "duplicate column name" in str(e):
+                    print(f"Column {col_name} already exists.")
+                else:
+                    print(f"Error adding {col_name}: {e}")
+        
+        # Each assignment records the dispatch run (report) that wrote it
+        try:
+            conn.execute(text("ALTER TABLE assignments ADD COLUMN report_id INT NULL"))
+            print("Added column: assignments.report_id")
+        except Exception as e:
+            if "Duplicate column name" in str(e) or "duplicate column name" in str(e):
+                print("Column assignments.report_id already exists.")
+            else:
+                print(f"Error adding assignments.report_id: {e}")
+        
+        conn.commit()
+        print("Daily reports update complete.")
+    
+    # ix_assignments_report
+    update_indexes()
+
+if __name__ == "__main__":
+    update_report_render_columns()
@@ -0,0 +1,45 @@
+from sqlalchemy import create_engine, text
+from backend.app.database import DATABASE_URL
+from update_indexes import update_indexes
+
+# Table -> column whose value seeds updated_at on existing rows (None: now)
+TABLES = {
+    "users": None,
+    "routes": "created_at",
+    "assignments": "COALESCE(response_time, assigned_date)",
+    "notifications": "created_at",
+}
+
+def update_sync_columns():
+    engine = create_engine(DATABASE_URL)
+    dialect = engine.dialect.name
+    with engine.connect() as conn:
+        print(f"Connected to database ({dialect}). Adding updated_at columns for delta sync...")
+
+        # Microsecond precision on MySQL, matching models.PreciseDateTime
+        column_type = "DATETIME(6) NULL" if dialect == "mysql" else "DATETIME"
+
+        for table, seed in TABLES.items():
+            try:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN updated_at {column_type}"))
+                conn.commit()
+                print(f"Added column: {table}.updated_at")
+            except Exception as e:
+                conn.rollback()
+                if "Duplicate column name" in str(e) or "duplicate column name" in str(e):
+                    print(f"Column {table}.updated_at already exists.")
+                else:
+                    print(f"Error adding {table}.updated_at: {e}")
+                    continue
+
+            # Existing rows get a stamp so the first delta sync after the upgrade can compare them
+            conn.execute(text(f"UPDATE {table} SET updated_at = {seed or 'CURRENT_TIMESTAMP'} WHERE updated_at IS NULL"))
+            conn.commit()
+
+        print("Sync columns update complete.")
+
+    # ix_assignments_driver_updated, ix_notifications_user_updated
+    update_indexes()
+
+if __name__ == "__main__":
+    update_sync_columns()
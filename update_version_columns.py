@@ -0,0 +1,23 @@
+from sqlalchemy import create_engine, text
+from backend.app.database import DATABASE_URL
+
+def update_version_columns():
+    engine = create_engine(DATABASE_URL)
+    with engine.connect() as conn:
+        print("Connected to database. Adding optimistic concurrency version columns...")
+        
+        # Bumped by every conditional assignment response
+        try:
+            conn.execute(text("ALTER TABLE assignments ADD COLUMN version INT NOT NULL DEFAULT 0"))
+            print("Added column: assignments.version")
+        except Exception as e:
+            if "Duplicate column name" in str(e) or "duplicate column name" in str(e):
+                print("Column assignments.version already exists.")
+            else:
+                print(f"Error adding assignments.version: {e}")
+            
+        conn.commit()
+        print("Version columns update complete.")
+
+if __name__ == "__main__":
+    update_version_columns()